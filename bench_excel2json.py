@@ -0,0 +1,180 @@
+"""
+excel2json.pyの各処理の時間を、リポジトリにあるエクセルファイルで計測するベンチマーク
+
+* get_schedule（ワークブック・シートごと）
+* 前期・後期18シートの読み込み全体（convert_sheets）
+* apply_inheritance
+* save_to_json
+* excel2jsonの読み込み（別プロセスでのimport）
+
+各処理は、初回（cold）と、2回目以降の最短時間（warm）・中央値（median）を計測する。
+結果はJSONで保存し、基準となる結果（ベースライン）と比べて遅くなった処理があれば終了コード1で終わる。
+シートごとの処理は1つ1つが短く実行ごとのばらつきが大きいため、比較するときはワークブックごとに合計する。
+
+使い方:
+    python bench_excel2json.py --save-baseline     # ベースラインを保存する
+    python bench_excel2json.py                     # ベースラインと比べる
+"""
+import argparse
+from collections import defaultdict
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import excel2json
+
+# 計測に使うエクセルファイル（前期のシート名のもの、後期のシート名のもの）
+SPRING_WORKBOOKS = ['schedule_spring.xlsx', 'schedule.xlsx', '【2025・04～09月 前期】全学年時間割.xlsx']
+FALL_WORKBOOKS = ['schedule_fall.xlsx']
+
+
+def measure(func, repeat):
+    """
+    funcを1+repeat回呼び、初回の時間と2回目以降の最短時間・中央値を返す関数
+
+    Returns:
+        dict: cold（初回の秒数）, warm（2回目以降の最短の秒数）, median（2回目以降の中央値の秒数）
+    """
+    times = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    warm_times = times[1:] if repeat else times
+    return {'cold': times[0], 'warm': min(warm_times), 'median': statistics.median(warm_times)}
+
+
+def run_benchmarks(repeat=7, reader='xml'):
+    """
+    すべての処理を計測する関数
+
+    Returns:
+        dict: 処理名をキー、計測結果を値とする辞書
+    """
+    results = {}
+
+    # excel2jsonの読み込み（毎回新しいプロセスで計測する）
+    command = [sys.executable, '-c', 'import excel2json']
+    results['import'] = measure(lambda: subprocess.run(command, check=True), repeat)
+
+    # シートごとの読み込み。coldはファイルを開くところから、warmは開いたワークブックを使い回す
+    jobs = []
+    for file_path in SPRING_WORKBOOKS:
+        jobs += [(file_path, sheet_name, grade) for sheet_name, grade in excel2json.SHEET_NAMES.items()]
+    for file_path in FALL_WORKBOOKS:
+        jobs += [(file_path, sheet_name.replace('前期', '後期'), grade) for sheet_name, grade in excel2json.SHEET_NAMES.items()]
+    for file_path in dict.fromkeys(job[0] for job in jobs):
+        if not os.path.exists(file_path):
+            continue
+        workbook = excel2json.open_workbook(file_path, reader)
+        try:
+            for path, sheet_name, grade in jobs:
+                if path != file_path:
+                    continue
+                cold = measure(lambda: excel2json.get_schedule(file_path, sheet_name, grade, reader=reader), 0)['cold']
+                warm = measure(lambda: excel2json.get_schedule(workbook, sheet_name, grade), repeat)
+                results[f'get_schedule:{file_path}:{sheet_name}'] = {**warm, 'cold': cold}
+        finally:
+            workbook.close()
+
+    # 前期・後期18シートの読み込み全体
+    build_jobs = excel2json.semester_jobs(SPRING_WORKBOOKS[0], FALL_WORKBOOKS[0])
+    results['convert_sheets'] = measure(lambda: excel2json.convert_sheets(build_jobs, reader=reader), repeat)
+
+    all_timetable = []
+    for timetable, _, _ in excel2json.convert_sheets(build_jobs, reader=reader):
+        all_timetable.extend(timetable)
+    # apply_inheritanceはリストに追加するため、毎回コピーを渡す
+    results['apply_inheritance'] = measure(lambda: excel2json.apply_inheritance(list(all_timetable)), repeat)
+    merged = excel2json.apply_inheritance(list(all_timetable))
+
+    with tempfile.TemporaryDirectory() as tmp_dir, contextlib.redirect_stdout(io.StringIO()):
+        # 同じ内容のファイルがあると書き込みを省くため、毎回新しいファイル名で保存して書き込みまで計測する
+        json_paths = (os.path.join(tmp_dir, f'schedule_{i}.json') for i in itertools.count())
+        results['save_to_json'] = measure(lambda: excel2json.save_to_json(merged, next(json_paths)), repeat)
+    return results
+
+
+def gate_times(stages):
+    """
+    比較に使う処理ごとの時間（中央値、古いベースラインではwarm）を返す関数
+
+    シートごとの処理（get_schedule:ファイル:シート）は、ワークブックごとの合計（get_schedule:ファイル）にまとめる。
+
+    Returns:
+        dict: 処理名をキー、秒数を値とする辞書
+    """
+    times = defaultdict(float)
+    for stage, result in stages.items():
+        if stage.startswith('get_schedule:'):
+            stage = stage.rsplit(':', 1)[0]
+        times[stage] += result.get('median', result['warm'])
+    return times
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """
+    ベースラインと比べて遅くなった処理を返す関数
+
+    中央値の時間がベースラインのthreshold倍を超え、かつ差がmin_seconds秒を超えたものを遅くなったとみなす。
+    シートごとの処理はワークブックごとに合計してから比べる。
+
+    Returns:
+        list: (処理名, ベースラインの秒数, 今回の秒数)のリスト
+    """
+    regressions = []
+    before_times = gate_times(baseline['stages'])
+    after_times = gate_times(results)
+    for stage, before in before_times.items():
+        if stage not in after_times:
+            continue
+        after = after_times[stage]
+        if after > before * threshold and after - before > min_seconds:
+            regressions.append((stage, before, after))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='excel2json.pyの処理時間を計測する')
+    parser.add_argument('--repeat', type=int, default=7, help='2回目以降（warm・median）の計測回数')
+    parser.add_argument('--reader', choices=excel2json.READERS, default='xml', help='ワークブックの読み込み方法')
+    parser.add_argument('--output', default='bench_results.json', help='計測結果を保存するJSONファイル')
+    parser.add_argument('--baseline', default='bench_baseline.json', help='比較に使うベースラインのJSONファイル')
+    parser.add_argument('--save-baseline', action='store_true', help='計測結果をベースラインとして保存する')
+    parser.add_argument('--threshold', type=float, default=1.25, help='遅くなったとみなす倍率')
+    parser.add_argument('--min-seconds', type=float, default=0.02, help='遅くなったとみなす最小の差（秒）')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeat, args.reader)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'reader': args.reader,
+        'repeat': args.repeat,
+        'stages': results,
+    }
+    for stage, result in results.items():
+        print(f"{stage}: cold {result['cold'] * 1000:.1f} ms, warm {result['warm'] * 1000:.1f} ms, median {result['median'] * 1000:.1f} ms")
+
+    output_path = args.baseline if args.save_baseline else args.output
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'{output_path} に保存しました。')
+
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        for stage, before, after in regressions:
+            print(f'✗ {stage}: {before * 1000:.1f} ms → {after * 1000:.1f} ms')
+        if regressions:
+            sys.exit(1)
+        print(f'✓ ベースライン（{args.baseline}）から{args.threshold}倍を超えて遅くなった処理はありません。')
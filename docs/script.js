@@ -7,6 +7,7 @@ $(document).ready(function () {
             this.grade = null; // For week view
             this.target = 'undergrad'; // 'undergrad' or 'graduate'
             this.scheduleData = [];
+            this.scheduleIndex = null; // schedule_index.json（日付→学年→時限の索引）
             this.infoData = null;
 
             // 定数
@@ -117,6 +118,18 @@ $(document).ready(function () {
             const diff = date.getDate() - day + (day === 0 ? -6 : 1);
             return new Date(date.setDate(diff));
         }
+
+        // 日付・学年・時限の授業を取得（索引があれば全データを探さずに直接引く）
+        findEntry(dateStr, grade, period) {
+            if (this.scheduleIndex) {
+                const grades = this.scheduleIndex.days[dateStr];
+                const periods = grades && grades[grade];
+                return (periods && periods[period]) || null;
+            }
+            return this.scheduleData.find(e =>
+                e.date === dateStr && e.grade === grade && e.period === period
+            ) || null;
+        }
     }
 
     // --- ビュー管理クラス ---
@@ -232,9 +245,7 @@ $(document).ready(function () {
             for (let period = 1; period <= 5; period++) {
                 let rowHtml = `<tr><td class="time-col">${period}限</td>`;
                 activeGrades.forEach(grade => {
-                    const entry = this.state.scheduleData.find(e =>
-                        e.date === dateStr && e.grade === grade && e.period === period
-                    );
+                    const entry = this.state.findEntry(dateStr, grade, period);
                     if (entry && entry.courses) {
                         rowHtml += `<td class="class-td"><div class="class-cell"><div class="class-name">${entry.courses}</div><div class="class-room">${entry.room || ''}</div></div></td>`;
                     } else {
@@ -272,9 +283,7 @@ $(document).ready(function () {
             for (let period = 1; period <= 5; period++) {
                 let rowHtml = `<tr><td class="time-col">${period}限</td>`;
                 dates.forEach(dateStr => {
-                    const entry = this.state.scheduleData.find(e =>
-                        e.date === dateStr && e.grade === this.state.grade && e.period === period
-                    );
+                    const entry = this.state.findEntry(dateStr, this.state.grade, period);
                     if (entry && entry.courses) {
                         rowHtml += `<td class="class-td"><div class="class-cell"><div class="class-name">${entry.courses}</div><div class="class-room">${entry.room || ''}</div></div></td>`;
                     } else {
@@ -436,12 +445,37 @@ $(document).ready(function () {
     class TimetableDataManager {
         constructor(state) {
             this.state = state;
+            this.manifest = null;
+        }
+
+        // manifest.json（データファイル名とハッシュ入りのファイル名の対応）は小さいので毎回取り直す
+        async loadManifest() {
+            try {
+                this.manifest = await $.ajax({ url: 'manifest.json', dataType: 'json', cache: false });
+            } catch (error) {
+                console.log("manifest.json not found, using plain file names.");
+                this.manifest = null;
+            }
+        }
+
+        // ハッシュ入りのファイル名があればそちらを使う（長期間キャッシュできる）
+        dataUrl(name) {
+            return (this.manifest && this.manifest.files && this.manifest.files[name]) || name;
         }
 
         async loadScheduleData() {
+            // 索引があれば、schedule.jsonは読み込まずに索引だけを使う
             try {
-                const data = await $.getJSON('schedule.json');
-                this.state.scheduleData = data;
+                this.state.scheduleIndex = await $.getJSON(this.dataUrl('schedule_index.json'));
+                console.log("Schedule index loaded successfully.");
+                return;
+            } catch (error) {
+                console.log("schedule_index.json not found, falling back to schedule.json.");
+                this.state.scheduleIndex = null;
+            }
+            try {
+                const data = await $.getJSON(this.dataUrl('schedule.json'));
+                this.state.scheduleData = this.decodeScheduleData(data);
                 console.log("Schedule data loaded successfully.");
             } catch (error) {
                 console.error("Failed to load schedule.json:", error);
@@ -450,10 +484,41 @@ $(document).ready(function () {
             }
         }
 
+        // excel2json.pyのどの出力形式からも、データごとのオブジェクトの配列を復元する
+        decodeScheduleData(data) {
+            if (Array.isArray(data)) {
+                return data;
+            }
+            const schema = data.schema;
+            if (schema.format === 'columnar') {
+                const records = new Array(schema.count);
+                for (let i = 0; i < schema.count; i++) {
+                    const record = {};
+                    schema.fields.forEach((field, j) => {
+                        record[field] = data.columns[j][i];
+                    });
+                    records[i] = record;
+                }
+                return records;
+            }
+            if (schema.format === 'dictionary') {
+                // 時限以外の項目は文字列表（strings）の番号になっている
+                const period = schema.fields.indexOf('period');
+                return data.records.map(values => {
+                    const record = {};
+                    schema.fields.forEach((field, j) => {
+                        record[field] = j === period ? values[j] : data.strings[values[j]];
+                    });
+                    return record;
+                });
+            }
+            throw new Error(`Unsupported schedule format: ${schema.format}`);
+        }
+
         async loadInfoData() {
             try {
-                const infoSprintData = await $.getJSON('info_spring.json');
-                const infoFallData = await $.getJSON('info_fall.json');
+                const infoSprintData = await $.getJSON(this.dataUrl('info_spring.json'));
+                const infoFallData = await $.getJSON(this.dataUrl('info_fall.json'));
 
                 const date_s = new Date(infoSprintData.last_modified);
                 const date_f = new Date(infoFallData.last_modified);
@@ -495,6 +560,7 @@ $(document).ready(function () {
             state.loadSettingsFromUrl();
 
             // データを読み込み
+            await dataManager.loadManifest();
             await dataManager.loadScheduleData();
             await dataManager.loadInfoData();
 
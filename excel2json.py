@@ -1,119 +1,1830 @@
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, date as date_type, timezone, timedelta
+import argparse
+import contextlib
+import filecmp
+import gzip
+import hashlib
+import heapq
+import io
 import os
-import pandas as pd
+import re
+import shutil
+import sys
+import tempfile
+import unicodedata
+import zipfile
 import json
-from collections import defaultdict
-# 以下のエラー抑制のための設定
-# FutureWarning: Downcasting object dtype arrays on .fillna, .ffill, .bfill is deprecated and will change in a future version. 
-pd.set_option('future.no_silent_downcasting', True)
+import time
+from collections import Counter, defaultdict
+from itertools import chain, groupby
+from operator import attrgetter
+from typing import NamedTuple
+import xlsx_reader
 
-def get_schedule(file_path, sheet_name, grade):
-    timetable = []
-    df = pd.read_excel(file_path, sheet_name=sheet_name, engine='openpyxl')
-    # B列に日付が入っていない行を削除
-    df = df[pd.to_datetime(df.iloc[:, 1], format='%Y-%m-%d', errors='coerce').notnull()]
-    df = df.fillna('').infer_objects(copy=False)
-    courses = defaultdict(int)
-    rooms = defaultdict(int)
-    for index, row in df.iterrows():
-        date = pd.to_datetime(row.iloc[1]).strftime('%Y-%m-%d')
-        comment = row.iloc[13]
+# 日本時間（UTC+9）のタイムゾーン
+JST = timezone(timedelta(hours=9))
+
+# 時間割シートの列構成（0始まり）
+DATE_COLUMN = 1      # B列：日付
+COMMENT_COLUMN = 13  # N列：備考
+PERIODS = range(1, 6)  # 1〜5限（科目名: i*2+1列、教室: i*2+2列）
+ROW_WIDTH = COMMENT_COLUMN + 1
+# pandas.read_excelが空欄として扱っていた文字列
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+# 前期のシート名と学年名の対応（後期のシート名は「前期」を「後期」に置き換えたもの）
+SHEET_NAMES = {
+    '2025年度(1年前期)': '1年生',
+    '2025年度(2年前期)': '2年生',
+    '2025年度(3年前期)': '3年生',
+    '2025年度(4年前期)': '4年生',
+    '2025年度(助産前期)': '4年助産',
+    '2025年度(M1前期)': 'M1',
+    '2025年度(M2前期)': 'M2',
+    '2025年度(D1前期)': 'D1',
+    '2025年度(D23前期)': 'D2/D3',
+}
+
+class Course(NamedTuple):
+    """
+    1件分の時間割データ
+
+    辞書の3分の1ほどの大きさで、学年だけを変えた複製も値を共有するため小さい。
+    辞書に変換するのはJSONなどに書き出すときだけ（_asdict）。
+    """
+    grade: str
+    date: str
+    period: int
+    courses: object
+    room: object
+    comment: object
+
+# 時間割データの項目（schedule.jsonでの順番）
+FIELDS = Course._fields
+
+class InheritanceRule(NamedTuple):
+    """
+    ある学年（target）が、別の学年（source）の時間割を引き継ぐ規則
+
+    targetに授業のない（日付, 時限）には、sourceのデータを学年だけ変えて追加する。
+    excludeには、引き継がない科目名の正規表現（先頭から一致）を並べる。
+    """
+    target: str
+    source: str
+    exclude: tuple = ()
+
+# 学年の時間割の引き継ぎ（apply_inheritanceが上から順に適用する）
+INHERITANCE_RULES = (
+    # 助産は、助産の授業がない時限に4年生の授業を受ける
+    InheritanceRule('4年助産', '4年生'),
+    # 卒業研究を引き継がない場合:
+    # InheritanceRule('4年助産', '4年生', exclude=('卒業研究',)),
+)
+# schedule.jsonの形式（records: データごとの辞書のリスト、columnar: 列ごとの配列、dictionary: 文字列表と番号）
+LAYOUTS = ('records', 'columnar', 'dictionary')
+# dictionary形式で文字列表の番号にする項目
+DICTIONARY_FIELDS = ('grade', 'date', 'courses', 'room', 'comment')
+
+# 学年・週ごとの分割ファイルの名前（例: 2025-W14.json、その圧縮ファイル 2025-W14.json.gz）
+SHARD_NAME_RE = re.compile(r'^(\d{4}-W\d{2}\.json)(\.gz|\.br)?$')
+
+# 内容のハッシュ入りのファイル名（例: schedule.0123456789ab.json、その圧縮ファイル）
+HASH_LENGTH = 12
+HASHED_NAME_RE = re.compile(r'^(.+\.[0-9a-f]{%d}\.json)(\.gz|\.br)?$' % HASH_LENGTH)
+
+# 版と版の差分ファイルの名前（例: 0123456789ab_ba9876543210.json、その圧縮ファイル）
+DELTA_NAME_RE = re.compile(r'^([0-9a-f]{%d}_[0-9a-f]{%d}\.json)(\.gz|\.br)?$' % (HASH_LENGTH, HASH_LENGTH))
+
+# 教室の欄の区切り（・、読点、カンマ、空白、括弧）と、教室名でない語
+ROOM_SEPARATOR_RE = re.compile(r'[・･、,\s()]+')
+ROOM_PLACEHOLDERS = {'別途指定', 'オンデマンド', 'リアルタイム', 'オンライン', '対面', '合同', 'リアルタイムになる可能性あり'}
+# "研修6･7"の"7"のように、前の教室名の番号だけを書いたものを補うための、前の教室名の番号より前の部分と番号
+ROOM_PREFIX_RE = re.compile(r'(\D+)(\d+)$')
+# 科目名を比べるときに無視する文字（空白・改行と中黒）と、括弧で書き添えた部分
+COURSE_NAME_IGNORE_RE = re.compile(r'[\s・]+')
+COURSE_NOTE_RE = re.compile(r'\([^()]*\)')
+# 複数の学年が一緒に教室を使うことを示す科目名の語（合同授業、特別講義）
+JOINT_SESSION_RE = re.compile(r'合同|特別講義')
+
+# schedule.dbのテーブル。monthは"2025-04"、weekはISO週（iso_weekと同じ"2025-W14"）
+SQLITE_SCHEMA = """
+CREATE TABLE schedule (
+    date TEXT NOT NULL,
+    grade TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    courses TEXT,
+    room TEXT,
+    comment TEXT,
+    month TEXT GENERATED ALWAYS AS (substr(date, 1, 7)) VIRTUAL,
+    week TEXT GENERATED ALWAYS AS (
+        strftime('%Y', date, '-3 days', 'weekday 4') || '-W' ||
+        printf('%02d', (strftime('%j', date, '-3 days', 'weekday 4') - 1) / 7 + 1)
+    ) VIRTUAL
+)
+"""
+# 学年ごと・日付ごと・教室ごとの検索に使う索引
+SQLITE_INDEXES = (
+    'CREATE INDEX schedule_grade_date ON schedule (grade, date, period)',
+    'CREATE INDEX schedule_date ON schedule (date)',
+    'CREATE INDEX schedule_room_date ON schedule (room, date, period)',
+)
+
+# ワークブックの読み込み方法（xml: xlsx_readerで必要なパーツだけ読む、openpyxl: openpyxlで読む）
+READERS = ('xml', 'openpyxl')
+
+class BuildMetrics:
+    """
+    変換の各段階の実行時間と処理量を記録するクラス
+
+    with metrics.phase('段階名') as entry: の中で処理を行い、entryに件数などを書き込む。
+    """
+
+    def __init__(self):
+        self.phases = []
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    @contextlib.contextmanager
+    def phase(self, name, **fields):
+        entry = {'phase': name, **fields}
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield entry
+        finally:
+            entry['wall_seconds'] = round(time.perf_counter() - start_wall, 6)
+            entry['cpu_seconds'] = round(time.process_time() - start_cpu, 6)
+            self.phases.append(entry)
+
+    def extend(self, phases):
+        """
+        ワーカープロセスで記録した段階を追加する
+        """
+        self.phases.extend(phases)
+
+    def to_dict(self):
+        phases = []
+        for entry in self.phases:
+            entry = dict(entry)
+            # 処理量があれば1秒あたりの処理量（スループット）も出す
+            for field in ('rows', 'records', 'bytes'):
+                if field in entry and entry['wall_seconds'] > 0:
+                    entry[f'{field}_per_second'] = round(entry[field] / entry['wall_seconds'], 1)
+            phases.append(entry)
+        return {
+            'generated_at': datetime.now(JST).strftime('%Y-%m-%d %H:%M:%S'),
+            'wall_seconds': round(time.perf_counter() - self.start_wall, 6),
+            'cpu_seconds': round(time.process_time() - self.start_cpu, 6),
+            'phases': phases,
+        }
+
+    def save(self, json_path):
+        data = json.dumps(self.to_dict(), ensure_ascii=False, indent=2).encode('utf-8')
+        replace_file(json_path, lambda f: f.write(data))
+        print(f'{json_path} に処理時間を保存しました。')
+
+def open_workbook(file_path, reader='xml'):
+    """
+    エクセルファイルを読み取り専用で一度だけ開く関数
+
+    Args:
+        file_path (str): エクセルファイルのパス
+        reader (str): 読み込み方法（READERSのいずれか）
+
+    Returns:
+        ワークブック（シート名で各シートを取り出せる。使い終わったらclose()する）
+    """
+    if reader == 'xml':
+        return xlsx_reader.load_workbook(file_path)
+    from openpyxl import load_workbook
+    return load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+
+def to_date(value):
+    """
+    B列のセルの値を日付に変換する関数。日付でなければNoneを返す。
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date_type):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    return None
+
+def intern_value(value):
+    """
+    文字列ならsys.internで同じ内容の文字列を1つのオブジェクトにまとめる関数（数値などはそのまま返す）
+    """
+    return sys.intern(value) if type(value) is str else value
+
+def make_course(grade, date, period, courses, room, comment):
+    """
+    学年・日付・教室の文字列をまとめてCourseを作る関数
+
+    同じ学年名・日付・教室名はすべてのデータで1つの文字列オブジェクトを共有する。
+    """
+    return Course(intern_value(grade), intern_value(date), period, courses, intern_value(room), comment)
+
+def clean_cell(value):
+    """
+    セルの値を出力用に整える関数。空欄はすべて''にそろえる。
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return '' if value in NA_STRINGS else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def iter_schedule(rows, grade):
+    """
+    シートの行を順に読みながら時間割データを1件ずつ返すジェネレータ
+
+    Args:
+        rows (iterable): 1行目（見出し行）を含むセル値のタプルの列
+        grade (str): 学年名
+
+    Yields:
+        Course: 時間割データ（備考はperiod=0のデータとして返す）
+    """
+    grade = sys.intern(grade)
+    rows = iter(rows)
+    # 1行目は見出し行
+    next(rows, None)
+    for row in rows:
+        if len(row) < ROW_WIDTH:
+            row = tuple(row) + (None,) * (ROW_WIDTH - len(row))
+        # B列に日付が入っていない行は読み飛ばす
+        day = to_date(row[DATE_COLUMN])
+        if day is None:
+            continue
+        date = sys.intern(day.strftime('%Y-%m-%d'))
+        comment = clean_cell(row[COMMENT_COLUMN])
         if comment:
-            course = {'grade': grade, 'date': date, 'period': 0, 'courses': '', 'room': '', 'comment': comment}
-            timetable.append(course)
-        for i in range(1, 6):
-            course_name = row.iloc[i*2+1]
-            room = row.iloc[i*2+2]
+            yield Course(grade, date, 0, '', '', comment)
+        for i in PERIODS:
+            course_name = clean_cell(row[i*2+1])
             if not course_name:
                 continue
-            course = {'grade': grade, 'date': date, 'period': i, 'courses': course_name, 'room': room, 'comment': ''}
-            courses[course_name] += 1
-            rooms[room] += 1
-            timetable.append(course)
+            room = intern_value(clean_cell(row[i*2+2]))
+            yield Course(grade, date, i, course_name, room, '')
+
+def frame_schedule(rows, grade):
+    """
+    シート全体をまとめて配列演算で時間割データに変換する関数（iter_scheduleのベクトル化版）
+
+    B列の日付変換、1〜5限の科目名・教室の列の縦持ちへの変換、空欄の除去、
+    科目・教室の集計をそれぞれシート単位で一度に行う。
+
+    Args:
+        rows (iterable): 1行目（見出し行）を含むセル値のタプルの列
+        grade (str): 学年名
+
+    Returns:
+        tuple: (時間割データのリスト, 科目ごとの件数, 教室ごとの件数)
+    """
+    # pandas・numpyは読み込みに時間がかかるため、この変換を使うときだけ読み込む
+    import numpy as np
+    import pandas as pd
+
+    df = pd.DataFrame(list(rows)[1:], dtype=object)
+    df = df.reindex(columns=range(max(ROW_WIDTH, df.shape[1])))
+    # B列に日付が入っていない行を削除
+    dates = pd.to_datetime(df[DATE_COLUMN], format='%Y-%m-%d', errors='coerce')
+    df = df[dates.notna().to_numpy()]
+    dates = dates[dates.notna()].dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    values = df.mask(df.isna() | df.isin(NA_STRINGS), '').to_numpy(dtype=object)
+
+    # 1〜5限の(科目名, 教室)の列の組を縦持ちにする。備考はperiod=0として先頭に置く
+    n_rows, n_periods = len(values), len(PERIODS)
+    pairs = values[:, PERIODS.start*2+1:PERIODS.stop*2+1].reshape(n_rows, n_periods, 2)
+    blank = np.full((n_rows, 1), '', dtype=object)
+    course_names = np.hstack([blank, pairs[:, :, 0]])
+    room_names = np.hstack([blank, pairs[:, :, 1]])
+    comments = np.hstack([values[:, [COMMENT_COLUMN]], np.full((n_rows, n_periods), '', dtype=object)])
+    long = pd.DataFrame({
+        'grade': grade,
+        'date': np.repeat(dates, n_periods + 1),
+        'period': np.tile(np.arange(n_periods + 1), n_rows),
+        'courses': course_names.ravel(),
+        'room': room_names.ravel(),
+        'comment': comments.ravel(),
+    })
+    # 科目名のない時限と、備考のない備考行を削除
+    long = long[np.where(long['period'] > 0, long['courses'].astype(bool), long['comment'].astype(bool))]
+
+    lessons = long[long['period'] > 0]
+    courses = defaultdict(int, lessons.groupby('courses', sort=False).size().to_dict())
+    rooms = defaultdict(int, lessons.groupby('room', sort=False).size().to_dict())
+    timetable = [make_course(*values) for values in long.itertuples(index=False, name=None)]
     return timetable, courses, rooms
 
-def save_to_json(timetable, json_path='schedule.json'):
+def _count_rows(rows, stats):
+    stats['rows'] = 0
+    for row in rows:
+        stats['rows'] += 1
+        yield row
+
+def get_schedule(file_path, sheet_name, grade, vectorized=False, reader='xml', stats=None):
+    """
+    1シート分の時間割を読み込む関数
+
+    Args:
+        file_path (str or ワークブック): エクセルファイルのパス、またはopen_workbookで開いたワークブック
+        sheet_name (str): シート名
+        grade (str): 学年名
+        vectorized (bool): Trueならframe_scheduleでシート単位にまとめて変換する
+        reader (str): file_pathがパスのときの読み込み方法（READERSのいずれか）
+        stats (dict, optional): 指定すると、読んだ行数を'rows'に書き込む
+
+    Returns:
+        tuple: (時間割データのリスト, 科目ごとの件数, 教室ごとの件数)
+    """
+    if isinstance(file_path, str):
+        workbook = open_workbook(file_path, reader)
+        try:
+            return get_schedule(workbook, sheet_name, grade, vectorized, stats=stats)
+        finally:
+            workbook.close()
+    rows = file_path[sheet_name].iter_rows(values_only=True)
+    if stats is not None:
+        rows = _count_rows(rows, stats)
+    if vectorized:
+        return frame_schedule(rows, grade)
+    timetable = []
+    courses = defaultdict(int)
+    rooms = defaultdict(int)
+    for course in iter_schedule(rows, grade):
+        if course.period:
+            courses[course.courses] += 1
+            rooms[course.room] += 1
+        timetable.append(course)
+    return timetable, courses, rooms
+
+def semester_jobs(s_excel_path, f_excel_path, sheet_names=SHEET_NAMES):
+    """
+    前期・後期のエクセルファイルから読み込むシートの一覧を作る関数
+
+    Returns:
+        list: (エクセルファイルのパス, シート名, 学年名)のリスト（前期の全学年、後期の全学年の順）
+    """
+    jobs = [(s_excel_path, sheet_name, grade_name) for sheet_name, grade_name in sheet_names.items()]
+    jobs += [(f_excel_path, sheet_name.replace('前期', '後期'), grade_name) for sheet_name, grade_name in sheet_names.items()]
+    return jobs
+
+# ワーカープロセスごとに開いたワークブック（(ファイルパス, 読み込み方法)をキーとする）
+_worker_workbooks = {}
+
+def _load_sheet(workbooks, file_path, sheet_name, grade, vectorized, reader, metrics):
+    """
+    1シートを変換する関数。workbooksに開いたワークブックを保存し、2回目以降は使い回す。
+    """
+    if (file_path, reader) not in workbooks:
+        with metrics.phase('open_workbook', file=file_path, reader=reader):
+            workbooks[(file_path, reader)] = open_workbook(file_path, reader)
+    with metrics.phase('get_schedule', file=file_path, sheet=sheet_name, grade=grade) as entry:
+        result = get_schedule(workbooks[(file_path, reader)], sheet_name, grade, vectorized, stats=entry)
+        entry['records'] = len(result[0])
+    return result
+
+def _convert_sheet(job):
+    """
+    ワーカープロセスで1シートを変換する関数。ワークブックはプロセスごとに一度だけ開く。
+
+    Returns:
+        tuple: (get_scheduleの結果, ワーカープロセスで記録した段階のリスト)
+    """
+    metrics = BuildMetrics()
+    return _load_sheet(_worker_workbooks, *job, metrics), metrics.phases
+
+def convert_sheets(jobs, workers=1, vectorized=False, reader='xml', metrics=None):
+    """
+    複数ファイル・複数シートの時間割をまとめて読み込む関数
+
+    Args:
+        jobs (list): (エクセルファイルのパス, シート名, 学年名)のリスト
+        workers (int): 並列に変換するプロセス数（1なら直列に変換する）
+        vectorized (bool): Trueならframe_scheduleでシート単位にまとめて変換する
+        reader (str): 読み込み方法（READERSのいずれか）
+        metrics (BuildMetrics, optional): ワークブックを開く時間とシートごとの変換時間を記録する
+
+    Returns:
+        list: jobsと同じ順の(時間割データのリスト, 科目ごとの件数, 教室ごとの件数)のリスト
+    """
+    if metrics is None:
+        metrics = BuildMetrics()
+    if workers <= 1:
+        # 各ワークブックは一度だけ開き、全シートの読み込みに使い回す
+        workbooks = {}
+        results = []
+        try:
+            for file_path, sheet_name, grade in jobs:
+                results.append(_load_sheet(workbooks, file_path, sheet_name, grade, vectorized, reader, metrics))
+        finally:
+            for workbook in workbooks.values():
+                workbook.close()
+        return results
+    from concurrent.futures import ProcessPoolExecutor
+    # 結果はjobsの順に並ぶため、直列に変換した場合と同じ順序で結合される
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = []
+        for result, phases in executor.map(_convert_sheet, [(*job, vectorized, reader) for job in jobs]):
+            metrics.extend(phases)
+            results.append(result)
+        return results
+
+def _check_date_order(records, source):
+    """
+    時間割データが日付順に並んでいることを確かめながら返すジェネレータ
+    """
+    previous = ''
+    for course in records:
+        if course.date < previous:
+            raise ValueError(f'{source}が日付順に並んでいません（{previous}の後に{course.date}）。')
+        previous = course.date
+        yield course
+
+def _stream_workbook(file_path, sheets, reader):
+    """
+    1つのエクセルファイルの全シートを1行ずつ読み、日付順にマージして返すジェネレータ
+    """
+    workbook = open_workbook(file_path, reader)
+    try:
+        streams = []
+        for sheet_name, grade in sheets:
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            streams.append(_check_date_order(iter_schedule(rows, grade), f'{file_path}の「{sheet_name}」'))
+        yield from heapq.merge(*streams, key=attrgetter('date'))
+    finally:
+        workbook.close()
+
+def stream_timetable(jobs, reader='xml'):
+    """
+    全シートの時間割データを、リストにまとめずに日付順で1件ずつ返すジェネレータ
+
+    エクセルファイルごとに、全シートを1行ずつ読みながら日付順にマージする（heapq.merge）。
+    同じ日付のデータはjobsの順に並ぶ。ファイルは1つずつ順に開くため、
+    各シートが日付順に並び、後のファイルが前のファイルより後の日付だけを含む必要がある（前期→後期）。
+
+    Args:
+        jobs (list): (エクセルファイルのパス, シート名, 学年名)のリスト
+        reader (str): 読み込み方法（READERSのいずれか）
+
+    Yields:
+        Course: 時間割データ
+    """
+    sheets = defaultdict(list)
+    for file_path, sheet_name, grade in jobs:
+        sheets[file_path].append((sheet_name, grade))
+    records = chain.from_iterable(_stream_workbook(file_path, file_sheets, reader) for file_path, file_sheets in sheets.items())
+    yield from _check_date_order(records, '・'.join(sheets))
+
+# 解析結果のキャッシュの形式。変換処理を変えたら上げる
+CACHE_VERSION = 2
+# キャッシュのエントリのファイル名（schedule_cache_keyなどで作ったSHA-256の16進文字列）
+CACHE_ENTRY_RE = re.compile(r'[0-9a-f]{64}\.json')
+
+def file_sha256(file_path):
+    """
+    ファイル内容のSHA-256を返す関数
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def schedule_cache_key(file_path, sheet_names):
+    """
+    ワークブックの内容とシートの対応表からキャッシュのキーを作る関数
+
+    Args:
+        file_path (str): エクセルファイルのパス
+        sheet_names (list): (シート名, 学年名)のリスト
+
+    Returns:
+        str: キャッシュのキー（16進文字列）
+    """
+    source = json.dumps([CACHE_VERSION, file_sha256(file_path), sheet_names], ensure_ascii=False)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+def load_cache(cache_dir, key):
+    """
+    キャッシュを読み込む関数。見つからなければNoneを返す。
+    読み込んだエントリは最終利用時刻を更新する（LRUで削除する順番に使う）。
+    """
+    path = os.path.join(cache_dir, f'{key}.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    os.utime(path)
+    return data
+
+def store_cache(cache_dir, key, data, max_entries):
+    """
+    キャッシュを保存し、最近使われていないエントリをmax_entries件まで削除する関数
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{key}.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    # キャッシュのエントリ（キーの名前のファイル）だけを数える。同じディレクトリのbuild_metrics.jsonなどは削除しない
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if CACHE_ENTRY_RE.fullmatch(name)]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for old_path in entries[max_entries:]:
+        os.remove(old_path)
+
+def sheet_fingerprints(file_path):
+    """
+    ワークブック全体を読み込まずに、シートごとの指紋をzipの中央ディレクトリから作る関数
+
+    各シートの指紋は、そのシートのXMLパーツと、セルの値に影響する共有文字列・スタイルの
+    CRC32とサイズから作る。あるシートだけが編集された場合は、そのシートの指紋だけが変わる。
+
+    Args:
+        file_path (str): エクセルファイルのパス
+
+    Returns:
+        dict: シート名をキー、指紋（16進文字列）を値とする辞書
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        parts = xlsx_reader.workbook_parts(archive)
+        entries = {info.filename: [info.CRC, info.file_size] for info in archive.infolist()}
+    shared = [entries.get(parts['shared_strings']), entries.get(parts['styles']), parts['date1904']]
+    fingerprints = {}
+    for sheet_name, path in parts['sheets'].items():
+        source = json.dumps([CACHE_VERSION, shared, entries.get(path)])
+        fingerprints[sheet_name] = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    return fingerprints
+
+def _sheet_to_cache(result):
+    timetable, courses, rooms = result
+    # 時間割データはFIELDSの順の値のリスト、教室名には数値もあるため件数は[値, 件数]の組のリストで保存する
+    return {'timetable': [list(course) for course in timetable], 'courses': list(courses.items()), 'rooms': list(rooms.items())}
+
+def _sheet_from_cache(sheet):
+    timetable = [make_course(*values) for values in sheet['timetable']]
+    return timetable, defaultdict(int, sheet['courses']), defaultdict(int, sheet['rooms'])
+
+def convert_sheets_cached(jobs, cache_dir, max_entries=8, workers=1, vectorized=False, reader='xml', metrics=None):
+    """
+    キャッシュを使い、前回から変わったシートだけを読み込む関数
+
+    ワークブックの内容が前回と同じなら、ワークブックを開かずにキャッシュを返す。
+    変わっていれば、シートごとの指紋を比べて、変わったシートだけを読み込み直す。
+
+    Args:
+        jobs (list): (エクセルファイルのパス, シート名, 学年名)のリスト
+        cache_dir (str): キャッシュを保存するディレクトリ
+        max_entries (int): 残しておくキャッシュの世代数
+        workers (int): 並列に変換するプロセス数
+        vectorized (bool): Trueならframe_scheduleでシート単位にまとめて変換する
+        reader (str): 読み込み方法（READERSのいずれか）
+        metrics (BuildMetrics, optional): キャッシュの確認とシートごとの変換時間を記録する
+
+    Returns:
+        list: jobsと同じ順の(時間割データのリスト, 科目ごとの件数, 教室ごとの件数)のリスト
+    """
+    if metrics is None:
+        metrics = BuildMetrics()
+    sheet_cache_dir = os.path.join(cache_dir, 'sheets')
+    results = {}
+    keys = {}
+    sheet_keys = {}
+    misses = []
+    for file_path in dict.fromkeys(job[0] for job in jobs):
+        file_jobs = [job for job in jobs if job[0] == file_path]
+        with metrics.phase('cache_lookup', file=file_path) as entry:
+            key = schedule_cache_key(file_path, [[sheet_name, grade] for _, sheet_name, grade in file_jobs])
+            cached = load_cache(cache_dir, key)
+            if cached is not None:
+                print(f'{file_path} は前回から変更がないため、キャッシュを使います。')
+                for job, sheet in zip(file_jobs, cached):
+                    results[job] = _sheet_from_cache(sheet)
+                entry['cached_sheets'] = len(file_jobs)
+                continue
+            keys[file_path] = key
+            fingerprints = sheet_fingerprints(file_path)
+            for job in file_jobs:
+                _, sheet_name, grade = job
+                sheet_key = hashlib.sha256(f'{fingerprints.get(sheet_name)}:{sheet_name}:{grade}'.encode('utf-8')).hexdigest()
+                cached = load_cache(sheet_cache_dir, sheet_key)
+                if cached is None:
+                    sheet_keys[job] = sheet_key
+                    misses.append(job)
+                else:
+                    results[job] = _sheet_from_cache(cached)
+            changed = sum(1 for job in file_jobs if job in sheet_keys)
+            entry['cached_sheets'] = len(file_jobs) - changed
+            print(f'{file_path} の変更されたシート: {changed}/{len(file_jobs)}')
+
+    for job, result in zip(misses, convert_sheets(misses, workers, vectorized, reader, metrics)):
+        results[job] = result
+    if keys:
+        with metrics.phase('cache_store'):
+            for job in misses:
+                store_cache(sheet_cache_dir, sheet_keys[job], _sheet_to_cache(results[job]), max_entries * len(jobs))
+            for file_path, key in keys.items():
+                sheets = [_sheet_to_cache(results[job]) for job in jobs if job[0] == file_path]
+                store_cache(cache_dir, key, sheets, max_entries)
+    return [results[job] for job in jobs]
+
+def encode_columnar(timetable):
+    """
+    時間割データを列ごとの配列にまとめる関数
+
+    各データでくり返されるキー名を省くため、項目ごとに1つの配列を作り、先頭に項目名の一覧（schema）を置く。
+
+    Args:
+        timetable (list): 時間割データのリスト
+
+    Returns:
+        dict: schema（形式・項目名・件数）とcolumns（項目ごとの配列のリスト）
+    """
+    return {
+        'schema': {'format': 'columnar', 'version': 1, 'fields': list(FIELDS), 'count': len(timetable)},
+        'columns': [list(values) for values in zip(*timetable)] or [[] for _ in FIELDS],
+    }
+
+def encode_dictionary(timetable, value_counts=None):
+    """
+    時間割データの文字列を文字列表にまとめ、各データを表の番号で表す関数
+
+    文字列表は出現回数の多い順に並べるため、よく使われる科目名・教室名ほど小さな番号になる。
+    get_scheduleが数えた科目・教室の件数を渡せば、その件数をそのまま使う。
+
+    Args:
+        timetable (list): 時間割データのリスト
+        value_counts (dict, optional): 科目名・教室名をキー、件数を値とする辞書
+
+    Returns:
+        dict: schema（形式・項目名・件数）、strings（文字列表）、
+              records（各データの[学年, 日付, 時限, 科目, 教室, 備考]。時限以外は文字列表の番号）
+    """
+    # 101と"101"を区別するため、値の型も含めて数える
+    counts = Counter()
+    for value, count in (value_counts or {}).items():
+        counts[(type(value), value)] += count
+    for course in timetable:
+        for field in DICTIONARY_FIELDS:
+            value = getattr(course, field)
+            key = (type(value), value)
+            # 件数を渡された科目名・教室名は、表に載せるだけで数えない
+            counts[key] += 0 if value_counts is not None and field in ('courses', 'room') else 1
+    # 件数の多い順（同じ件数なら先に出てきた順）に並べる
+    keys = sorted(counts, key=counts.get, reverse=True)
+    index = {key: i for i, key in enumerate(keys)}
+    records = [
+        [value if field == 'period' else index[(type(value), value)] for field, value in zip(FIELDS, course)]
+        for course in timetable
+    ]
+    return {
+        'schema': {'format': 'dictionary', 'version': 1, 'fields': list(FIELDS), 'count': len(timetable)},
+        'strings': [value for _, value in keys],
+        'records': records,
+    }
+
+def decode_schedule(data):
+    """
+    save_to_jsonで保存した、どの形式のデータからも時間割データのリストを復元する関数
+
+    Args:
+        data: schedule.jsonを読み込んだ値
+
+    Returns:
+        list: 時間割データ（Course）のリスト
+    """
+    if isinstance(data, list):
+        return [make_course(**course) for course in data]
+    schema = data['schema']
+    if schema['format'] == 'columnar':
+        return [make_course(**dict(zip(schema['fields'], values))) for values in zip(*data['columns'])]
+    if schema['format'] == 'dictionary':
+        strings = data['strings']
+        period = schema['fields'].index('period')
+        return [
+            make_course(**dict(zip(schema['fields'], (value if i == period else strings[value] for i, value in enumerate(record)))))
+            for record in data['records']
+        ]
+    raise ValueError(f"未対応の形式です: {schema['format']}")
+
+def sort_timetable(timetable, grades=tuple(SHEET_NAMES.values())):
+    """
+    時間割データを（日付, 学年, 時限）の順に並べ替える関数
+
+    読み込んだ順番やキャッシュの有無によらず、同じ内容なら同じ並びになる。
+    学年はgradesの順（gradesにない学年はその後）に並べる。
+    """
+    rank = {grade: i for i, grade in enumerate(grades)}
+    return sorted(timetable, key=lambda course: (course.date, rank.get(course.grade, len(rank)), course.grade, course.period))
+
+def replace_if_changed(temp_path, path):
+    """
+    書き終えた一時ファイルを、内容が違うときだけpathと置き換える関数。同じ内容なら一時ファイルを削除する。
+
+    Returns:
+        bool: 置き換えたらTrue、同じ内容だったのでスキップしたらFalse
+    """
+    if os.path.exists(path) and filecmp.cmp(temp_path, path, shallow=False):
+        os.remove(temp_path)
+        return False
+    os.replace(temp_path, path)
+    return True
+
+def replace_file(path, write):
+    """
+    一時ファイルに書き込んでから、元のファイルと置き換える関数
+
+    途中で失敗しても、元のファイルが書きかけの状態で残ることはない。
+    書き込んだ内容が元のファイルと同じなら置き換えない。
+
+    Args:
+        path (str): 書き込むファイルのパス
+        write (callable): 開いた一時ファイルを受け取って書き込む関数
+
+    Returns:
+        bool: 置き換えたらTrue、同じ内容だったのでスキップしたらFalse
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            write(f)
+        return replace_if_changed(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def write_if_changed(path, data):
+    """
+    内容が変わったときだけファイルを書き込む関数
+
+    Args:
+        path (str): 書き込むファイルのパス
+        data (bytes): 書き込む内容
+
+    Returns:
+        bool: 書き込んだらTrue、同じ内容だったのでスキップしたらFalse
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    return replace_file(path, lambda f: f.write(data))
+
+def json_bytes(data, compact=False):
+    """
+    JSONとして書き込む内容をバイト列で返す関数
+    """
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    return text.encode('utf-8')
+
+def save_to_json(timetable, json_path='schedule.json', compact=False, layout='records', value_counts=None, index=None):
     """
     時間割データをJSON形式で保存する関数
     
     Args:
         timetable (list): 時間割データのリスト
         json_path (str): 保存するJSONファイルのパス
+        compact (bool): Trueなら空白・改行を入れずに保存する
+        layout (str): 'records'ならデータごとの辞書のリスト、'columnar'なら列ごとの配列（encode_columnar）、
+                      'dictionary'なら文字列表と番号（encode_dictionary）で保存する
+        value_counts (dict, optional): 'dictionary'で文字列表の並び順に使う、科目名・教室名の件数
+        index (dict, optional): new_lookup_indexで作った索引。'records'では各データを辞書にするのと同じ走査で加える
+
+    Returns:
+        bool: 書き込んだらTrue、前回と同じ内容だったのでスキップしたらFalse
     """
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(timetable, f, ensure_ascii=False, indent=2)
-    print(f'{json_path} に保存しました。')
+    if layout == 'columnar':
+        data = encode_columnar(timetable)
+    elif layout == 'dictionary':
+        data = encode_dictionary(timetable, value_counts)
+    else:
+        data = None
+    # 変換した形式から元のデータに戻せることを確かめてから保存する
+    if data is not None and decode_schedule(data) != timetable:
+        raise ValueError(f'{layout}形式に変換したデータから元の時間割データを復元できません。')
+    if data is None and index is not None:
+        data = []
+        for course in timetable:
+            add_to_index(index, course)
+            data.append(course._asdict())
+    elif data is None:
+        # データごとの辞書にするのは、JSONに書き出すときだけ
+        data = [course._asdict() for course in timetable]
+    elif index is not None:
+        for course in timetable:
+            add_to_index(index, course)
+    written = write_if_changed(json_path, json_bytes(data, compact))
+    print(f'{json_path} に保存しました。' if written else f'{json_path} は変更がありません。')
+    return written
+
+def iter_json_array(records, compact=False):
+    """
+    時間割データ（Course）を1件ずつ辞書にして、JSONの配列として少しずつ返すジェネレータ
+
+    辞書のリスト全体をjson_bytesで変換した場合と同じバイト列になる。
 
-def add_schedule_to_josan(timetable):
+    Yields:
+        bytes: JSONの配列の一部
     """
-    助産前期の時間割を4年生の時間割に追加する関数
+    first = True
+    for course in records:
+        course = course._asdict()
+        if compact:
+            text = json.dumps(course, ensure_ascii=False, separators=(',', ':'))
+            yield (b'[' if first else b',') + text.encode('utf-8')
+        else:
+            # 配列の要素として、各行を2文字分字下げする
+            text = json.dumps(course, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+            yield (b'[\n  ' if first else b',\n  ') + text.encode('utf-8')
+        first = False
+    if first:
+        yield b'[]'
+    else:
+        yield b']' if compact else b'\n]'
+
+def stream_to_json(records, json_path='schedule.json', compact=False):
     """
-    forth_grade = {}
-    josan_course = {}
-    # それぞれの時間割を辞書に変換
+    時間割データを1件ずつJSONの配列として書き出す関数（save_to_jsonのストリーミング版）
+
+    全件をリストにまとめず、一時ファイルに書き込んでから元のファイルと置き換える。
+
+    Args:
+        records (iterable): 時間割データを1件ずつ返すイテラブル
+        json_path (str): 保存するJSONファイルのパス
+        compact (bool): Trueなら空白・改行を入れずに保存する
+
+    Returns:
+        tuple: (書き込んだかどうか, 書き出した件数)
+    """
+    count = 0
+    def counted():
+        nonlocal count
+        for course in records:
+            count += 1
+            yield course
+    def write(f):
+        for chunk in iter_json_array(counted(), compact):
+            f.write(chunk)
+    written = replace_file(json_path, write)
+    print(f'{json_path} に保存しました。' if written else f'{json_path} は変更がありません。')
+    return written, count
+
+def save_to_sqlite(records, db_path='schedule.db'):
+    """
+    時間割データをSQLiteのデータベース（OLD/の各スクリプトが読むschedule.db）に保存する関数
+
+    一時ファイルに1つのトランザクションでまとめて書き込み、索引を作ってANALYZEしてから元のファイルと置き換える。
+    scheduleテーブルには、日付から計算する月（"2025-04"）とISO週（"2025-W14"）の列もある。
+
+    Args:
+        records (iterable): 時間割データ（リスト、またはstream_timetableなどのジェネレータ）
+        db_path (str): 保存するデータベースファイルのパス
+
+    Returns:
+        tuple: (書き込んだかどうか, 保存した件数)
+    """
+    import sqlite3
+
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    temp_path = f'{db_path}.{os.getpid()}.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path, isolation_level=None)
+    try:
+        # 書き終えるまでは一時ファイルなので、ジャーナルと同期は省く
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('BEGIN')
+        conn.execute(SQLITE_SCHEMA)
+        cursor = conn.executemany(
+            'INSERT INTO schedule (date, grade, period, courses, room, comment) VALUES (?, ?, ?, ?, ?, ?)',
+            ((course.date, course.grade, course.period, course.courses, course.room, course.comment)
+             for course in records))
+        count = cursor.rowcount
+        # 索引はデータを入れ終えてから作るほうが速い
+        for statement in SQLITE_INDEXES:
+            conn.execute(statement)
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE')
+        conn.close()
+        written = replace_if_changed(temp_path, db_path)
+    except BaseException:
+        conn.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    print(f'{db_path} に{count}件保存しました。' if written else f'{db_path} は変更がありません。')
+    return written, count
+
+def semester_of(date):
+    """
+    "2025-04-03"のような日付から、年度と学期を"2025-spring"（4〜9月）、"2025-fall"（10〜翌3月）の形で返す関数
+    """
+    year, month = int(date[:4]), int(date[5:7])
+    if month < 4:
+        return f'{year - 1}-fall'
+    return f'{year}-spring' if month < 10 else f'{year}-fall'
+
+def save_to_parquet(records, parquet_dir):
+    """
+    時間割データを学期ごとに分けたParquetファイルに保存する関数（分析用）
+
+    parquet_dir/semester=2025-spring/part-0.parquet のようにHive形式で学期ごとに分ける。
+    dateはdate32、periodはint8、gradeとroomは辞書符号化した文字列として保存する。
+    pyarrow.parquet.read_table(parquet_dir, memory_map=True) で学期の列を含めて読み込める。
+    データのなくなった学期のファイルは削除する。
+
+    Args:
+        records (iterable): 時間割データ（リスト、またはstream_timetableなどのジェネレータ）
+        parquet_dir (str): 保存するディレクトリ
+
+    Returns:
+        dict: 保存したファイルのパスをキー、書き込んだかどうかを値とする辞書
+    """
+    # pyarrowは分析用の出力にだけ使うため、ここで読み込む
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = defaultdict(lambda: {field: [] for field in FIELDS})
+    for course in records:
+        partition = columns[semester_of(course.date)]
+        for field, value in zip(FIELDS, course):
+            partition[field].append(value)
+
+    category = pa.dictionary(pa.int32(), pa.string())
+    os.makedirs(parquet_dir, exist_ok=True)
+    written = {}
+    for semester, partition in columns.items():
+        table = pa.table({
+            'grade': pa.array(partition['grade'], category),
+            'date': pa.array(partition['date'], pa.string()).cast(pa.date32()),
+            'period': pa.array(partition['period'], pa.int8()),
+            # 科目名・教室は数値のセルもあるため、文字列にそろえる
+            'courses': pa.array([str(value) for value in partition['courses']], pa.string()),
+            'room': pa.array([str(value) for value in partition['room']], category),
+            'comment': pa.array([str(value) for value in partition['comment']], pa.string()),
+        })
+        path = os.path.join(parquet_dir, f'semester={semester}', 'part-0.parquet')
+        written[path] = replace_file(path, lambda f: pq.write_table(table, f))
+
+    # データのなくなった学期のファイルを削除する
+    for name in os.listdir(parquet_dir):
+        path = os.path.join(parquet_dir, name, 'part-0.parquet')
+        if name.startswith('semester=') and path not in written and os.path.exists(path):
+            os.remove(path)
+            if not os.listdir(os.path.join(parquet_dir, name)):
+                os.rmdir(os.path.join(parquet_dir, name))
+    print(f'{parquet_dir} に学期ごとのParquetファイルを保存しました（{len(written)}件中{sum(written.values())}件を更新）。')
+    return written
+
+def gzip_bytes(data):
+    """
+    最大の圧縮レベルでgzip圧縮する関数
+
+    ヘッダーの更新時刻は0、ファイル名は空にするため、同じ内容からは常に同じバイト列になる。
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', fileobj=buffer, compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+def brotli_bytes(data):
+    """
+    最大の圧縮レベルでbrotli圧縮する関数。brotliがインストールされていなければNoneを返す。
+    """
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+def save_precompressed(path, force=True):
+    """
+    ファイルを圧縮した .gz と .br をファイルの隣に保存する関数
+
+    Args:
+        path (str): 圧縮する元のファイルのパス
+        force (bool): Falseなら、元のファイルが書き換えられておらず圧縮ファイルもそろっている場合は何もしない
+
+    Returns:
+        list: 書き込んだ圧縮ファイルのパスのリスト
+    """
+    compressors = {'.gz': gzip_bytes, '.br': brotli_bytes}
+    if not force and all(os.path.exists(path + suffix) for suffix in compressors):
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    for suffix, compress in compressors.items():
+        compressed = compress(data)
+        if compressed is not None and write_if_changed(path + suffix, compressed):
+            written.append(path + suffix)
+    return written
+
+def new_lookup_index():
+    """
+    add_to_indexで作る、画面表示用の索引の空のデータを返す関数
+
+    days[日付][学年][時限] に {courses, room} を、comments[日付][学年] にその日の備考のリストを置く。
+    """
+    return {'schema': {'format': 'index', 'version': 1}, 'days': {}, 'comments': {}}
+
+def add_to_index(index, course):
+    """
+    時間割データ1件を索引に加える関数
+
+    同じ（日付, 学年, 時限）のデータが複数あれば、先に出てきたものを使う（script.jsのfindと同じ）。
+    """
+    if course.period:
+        periods = index['days'].setdefault(course.date, {}).setdefault(course.grade, {})
+        periods.setdefault(str(course.period), {'courses': course.courses, 'room': course.room})
+    elif course.comment:
+        index['comments'].setdefault(course.date, {}).setdefault(course.grade, []).append(course.comment)
+
+def iter_indexed(records, index_writer, rooms=None):
+    """
+    時間割データを1件ずつ索引（と教室の使用状況）に加えながら、そのまま返すジェネレータ
+
+    schedule.jsonの書き出しと同じ走査で索引を作るために使う。
+
+    Args:
+        records (iterable): 日付順に並んだ時間割データ
+        index_writer (LookupIndexWriter): 索引を1日分ずつ書き出すオブジェクト
+        rooms (dict, optional): new_room_indexで作った教室の使用状況（全期間分をメモリに持つ）
+    """
+    for course in records:
+        index_writer.add(course)
+        if rooms is not None:
+            add_to_room_index(rooms, course)
+        yield course
+
+def build_lookup_index(timetable):
+    """
+    時間割データから、日付→学年→時限で引ける索引と日ごとの備考を作る関数
+
+    script.jsは各セルの授業を、全データを探す代わりにこの索引から直接引く。
+
+    Args:
+        timetable (iterable): 時間割データ
+
+    Returns:
+        dict: schema、days（日付→学年→時限→{courses, room}）、comments（日付→学年→備考のリスト）
+    """
+    index = new_lookup_index()
+    for course in timetable:
+        add_to_index(index, course)
+    return index
+
+def json_member(key, value, compact=False, depth=2):
+    """
+    JSONのオブジェクトの1項目（"キー": 値）を、json_bytesでオブジェクト全体を書いた場合と同じ形で返す関数
+
+    Args:
+        depth (int): 項目を置くオブジェクトの深さ（字下げの段数）
+    """
+    key = json.dumps(key, ensure_ascii=False)
+    if compact:
+        return f"{key}:{json.dumps(value, ensure_ascii=False, separators=(',', ':'))}"
+    text = json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n' + '  ' * depth)
+    return f'{key}: {text}'
+
+class LookupIndexWriter:
+    """
+    日付順の時間割データから、build_lookup_indexと同じ内容の索引を1日分ずつ書き出すクラス
+
+    索引は日付が最初のキーのため、日付が変わるたびにその日の分をファイルに書き出して捨てる。
+    メモリに持つのは1日分だけで、年度が増えても変わらない。
+    daysは一時ファイルに、その後に置くcommentsは別の一時ファイルに書いておき、最後につなげて置き換える。
+
+    使い方:
+        with LookupIndexWriter('docs/schedule_index.json') as index_writer:
+            for course in records:
+                index_writer.add(course)
+        index_writer.written  # 書き込んだかどうか
+    """
+
+    def __init__(self, path, compact=False):
+        self.path = path
+        self.compact = compact
+        self.written = False
+        self._date = None
+        self._day = new_lookup_index()
+        self._counts = {'days': 0, 'comments': 0}
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._temp_path = f'{self.path}.{os.getpid()}.tmp'
+        self._files = {'days': open(self._temp_path, 'wb'), 'comments': tempfile.TemporaryFile()}
+        # schemaと"days"のキーまでを先に書く
+        head = json_bytes({'schema': self._day['schema']}, self.compact)
+        self._files['days'].write(head[:-1] + self._key('days') if self.compact else head[:-2] + self._key('days'))
+        return self
+
+    def add(self, course):
+        """
+        時間割データ1件を索引に加える（日付順に渡す）
+        """
+        if course.date != self._date:
+            self._flush()
+            self._date = course.date
+        add_to_index(self._day, course)
+
+    def _key(self, name):
+        return f',"{name}":'.encode('utf-8') if self.compact else f',\n  "{name}": '.encode('utf-8')
+
+    def _flush(self):
+        indent = '' if self.compact else '\n    '
+        for name in ('days', 'comments'):
+            for date, value in self._day[name].items():
+                separator = ',' if self._counts[name] else '{'
+                self._files[name].write(f'{separator}{indent}{json_member(date, value, self.compact)}'.encode('utf-8'))
+                self._counts[name] += 1
+            self._day[name].clear()
+
+    def _close_object(self, name):
+        if not self._counts[name]:
+            return b'{}'
+        return b'}' if self.compact else b'\n  }'
+
+    def __exit__(self, exc_type, exc, tb):
+        days, comments = self._files['days'], self._files['comments']
+        try:
+            if exc_type is None:
+                self._flush()
+                days.write(self._close_object('days') + self._key('comments'))
+                comments.seek(0)
+                shutil.copyfileobj(comments, days)
+                days.write(self._close_object('comments') + (b'}' if self.compact else b'\n}'))
+        finally:
+            comments.close()
+            days.close()
+        if exc_type is None:
+            self.written = replace_if_changed(self._temp_path, self.path)
+        elif os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        return False
+
+def split_rooms(room):
+    """
+    教室の欄から、個々の教室名を取り出す関数
+
+    "201･202･基礎実"、"英A:202 情報:201"、"成育：302\n長寿:101・102" のような欄を、
+    全角・半角をそろえてから区切り文字・空白・括弧で分け、"英A:"のような見出しを除く。
+    "研修6･7"の"7"のような番号だけのものは前の教室名にそろえて"研修7"とし、"302教室"は"302"とする。
+    "別途指定"などの教室でない語（ROOM_PLACEHOLDERS）は除く。
+
+    Returns:
+        list: 教室名のリスト（重複なし、出てきた順）
+    """
+    text = unicodedata.normalize('NFKC', str(room))
+    rooms = []
+    prefix, width = '', 0
+    for token in ROOM_SEPARATOR_RE.split(text):
+        label, _, token = token.rpartition(':')
+        if token.endswith('教室') and token != '教室':
+            token = token[:-2]
+        # "英B:LL2 情報:201"の"201"のように、見出しのあるものや前の番号より桁の多いものは別の教室
+        if token.isdigit() and not label and len(token) <= width:
+            token = prefix + token
+        match = ROOM_PREFIX_RE.match(token)
+        prefix, width = (match.group(1), len(match.group(2))) if match else ('', 0)
+        if token and token not in ROOM_PLACEHOLDERS and token not in rooms:
+            rooms.append(token)
+    return rooms
+
+def course_name_key(name):
+    """
+    科目名を比べるためのキーを返す関数
+
+    全角・半角、空白、中黒の違いを無視し、1行目だけを、括弧で書き添えた部分を除いて比べる。
+    "卒業研究発表会(聴講)"と"卒業研究発表会"、"図書館利用について\nQ&A・同窓会"と"図書館利用について"は同じキーになる。
+    """
+    text = unicodedata.normalize('NFKC', str(name))
+    first_line = COURSE_NOTE_RE.sub('', text.strip().split('\n', 1)[0])
+    return COURSE_NAME_IGNORE_RE.sub('', first_line) or COURSE_NAME_IGNORE_RE.sub('', text)
+
+def shares_room(entry, other):
+    """
+    同じ時限に同じ教室を使う2件（add_to_room_indexのエントリ）が、一緒に行う授業とみなせるかを返す関数
+
+    次のいずれかなら重複ではないとみなす。
+
+    * 科目名のキー（course_name_key）が同じ（助産が4年生の授業を受けるなど）
+    * 複数の教室を書いた教室の欄がまったく同じ（"201･202･基礎実･成人実"のように、同じ教室の組を学年ごとに書いた合同授業など）。
+      "201"のように教室が1つだけの欄は、別の科目でも同じになるため比べない
+    * どちらの科目名にも合同・特別講義と書かれている（JOINT_SESSION_RE）
+    """
+    if entry[3] == other[3]:
+        return True
+    if entry[4] is not None and entry[4] == other[4]:
+        return True
+    return entry[5] and other[5]
+
+def new_room_index():
+    """
+    add_to_room_indexで作る、教室の使用状況の空のデータを返す関数
+
+    slots[教室][(日付, 時限)] に、その時限にその教室を使う
+    (学年, 科目名, 教室の欄, 科目名のキー, 教室の欄のキー（教室が1つだけならNone）, 合同授業かどうか)のリストを置く。
+    conflictsには、一緒に行う授業とみなせない（shares_roomがFalseの）2件が同じ教室を使う(教室, 日付, 時限)を入れる。
+    """
+    return {'slots': defaultdict(dict), 'conflicts': set()}
+
+def add_to_room_index(rooms, course):
+    """
+    時間割データ1件の教室の使用を、教室の使用状況に加える関数
+
+    辞書で(教室, 日付, 時限)を直接引くため、教室や年度が増えても件数に比例した時間で済む。
+    """
+    if not course.period:
+        return
+    slot = (course.date, course.period)
+    course_rooms = split_rooms(course.room)
+    cell_key = COURSE_NAME_IGNORE_RE.sub('', unicodedata.normalize('NFKC', str(course.room))) if len(course_rooms) > 1 else None
+    entry = (
+        course.grade, course.courses, course.room, course_name_key(course.courses), cell_key,
+        JOINT_SESSION_RE.search(str(course.courses)) is not None,
+    )
+    for room in course_rooms:
+        entries = rooms['slots'][room].setdefault(slot, [])
+        if not all(shares_room(entry, other) for other in entries):
+            rooms['conflicts'].add((room, *slot))
+        entries.append(entry)
+
+def build_room_index(timetable):
+    """
+    時間割データから教室の使用状況を作る関数（全学年・前期後期をまとめて1回だけ走査する）
+
+    重複の判定の例（python -m doctest excel2json.py で確かめられる）:
+
+    >>> build_room_index([
+    ...     make_course('1年生', '2025-04-01', 1, '解剖学', '201', ''),
+    ...     make_course('3年生', '2025-04-01', 1, '老年看護援助論', '201', ''),
+    ... ])['conflicts']
+    {('201', '2025-04-01', 1)}
+    >>> build_room_index([
+    ...     make_course('1年生', '2025-04-01', 1, '1・2年生合同演習', '201', ''),
+    ...     make_course('3年生', '2025-04-01', 1, '老年看護援助論', '201･202', ''),
+    ... ])['conflicts']
+    {('201', '2025-04-01', 1)}
+    >>> build_room_index([
+    ...     make_course('1年生', '2025-04-01', 1, '生活援助論Ⅰ(1･2年生合同)', '201･202', ''),
+    ...     make_course('2年生', '2025-04-01', 1, '生活援助論Ⅲ(1･2年生合同)', '201･202', ''),
+    ...     make_course('4年生', '2025-04-01', 1, '卒業研究発表会', '101･201', ''),
+    ...     make_course('2年生', '2025-04-01', 2, '卒業研究発表会(聴講)', '101', ''),
+    ...     make_course('4年生', '2025-04-01', 2, '卒業研究発表会', '101･201', ''),
+    ... ])['conflicts']
+    {('201', '2025-04-01', 1)}
+    """
+    rooms = new_room_index()
     for course in timetable:
-        if course['grade'] == '4年生':
-            forth_grade[course['date'] + str(course['period'])] = course
-        elif course['grade'] == '4年助産':
-            josan_course[course['date'] + str(course['period'])] = course
-    # 4年生の時間割を助産前期の時間割に追加
-    for key, course in forth_grade.items():
-        # すでに助産前期の時間割が存在する場合はスキップ
-        if key in josan_course:
+        add_to_room_index(rooms, course)
+    return rooms
+
+def save_room_index(rooms, room_dir, compact=True, grades=tuple(SHEET_NAMES.values())):
+    """
+    教室の使用状況を room_dir/rooms.json に、重複の一覧を room_dir/conflicts.json に保存する関数
+
+    rooms.jsonは 教室→日付→時限→[[学年, 科目名], ...]、
+    conflicts.jsonは 日付・時限・教室の順に並べた {date, period, room, courses: [{grade, courses, room}]} のリスト。
+    時間割データの並び順によらず同じ内容になるよう、各時限の学年はgradesの順に並べる。
+
+    Returns:
+        dict: 保存したファイルのパスをキー、書き込んだかどうかを値とする辞書
+    """
+    rank = {grade: i for i, grade in enumerate(grades)}
+    def ordered(entries):
+        return sorted(entries, key=lambda entry: (rank.get(entry[0], len(rank)), entry[0]))
+
+    by_room = {}
+    for room in sorted(rooms['slots']):
+        days = by_room[room] = {}
+        for (date, period), entries in sorted(rooms['slots'][room].items()):
+            days.setdefault(date, {})[str(period)] = [[entry[0], entry[1]] for entry in ordered(entries)]
+    conflicts = [
+        {'date': date, 'period': period, 'room': room,
+         'courses': [{'grade': entry[0], 'courses': entry[1], 'room': entry[2]}
+                     for entry in ordered(rooms['slots'][room][(date, period)])]}
+        for room, date, period in sorted(rooms['conflicts'], key=lambda key: (key[1], key[2], key[0]))
+    ]
+    rooms_path = os.path.join(room_dir, 'rooms.json')
+    conflicts_path = os.path.join(room_dir, 'conflicts.json')
+    written = {
+        rooms_path: write_if_changed(rooms_path, json_bytes(by_room, compact)),
+        conflicts_path: write_if_changed(conflicts_path, json_bytes(conflicts, compact)),
+    }
+    print(f'{room_dir} に教室の使用状況を保存しました（教室{len(by_room)}件、重複{len(conflicts)}件）。')
+    return written
+
+def shard_dir_name(grade):
+    """
+    学年名から分割ファイルを置くディレクトリ名を作る関数（"D2/D3"の"/"などを置き換える）
+    """
+    return re.sub(r'[\\/:*?"<>|]', '-', grade)
+
+def iso_week(date):
+    """
+    "2025-04-03"のような日付から"2025-W14"のようなISO週番号を返す関数
+    """
+    year, week, _ = datetime.strptime(date, '%Y-%m-%d').isocalendar()
+    return f'{year}-W{week:02d}'
+
+def save_shards(timetable, shard_dir, compact=False):
+    """
+    時間割データを学年・週ごとのファイルに分けて保存する関数
+
+    shard_dir/{学年}/{ISO週}.json に各週のデータを、shard_dir/index.json に分割ファイルの一覧を保存する。
+    内容が変わっていないファイルは書き込まず、データのなくなった週のファイルは削除する。
+
+    Args:
+        timetable (list): 時間割データのリスト
+        shard_dir (str): 分割ファイルを保存するディレクトリ
+        compact (bool): Trueなら空白・改行を入れずに保存する
+
+    Returns:
+        dict: 保存したファイルのパスをキー、書き込んだかどうか（内容が変わったか）を値とする辞書
+    """
+    shards = defaultdict(list)
+    weeks = {}
+    for course in timetable:
+        week = weeks.get(course.date)
+        if week is None:
+            week = weeks[course.date] = iso_week(course.date)
+        shards[(course.grade, week)].append(course._asdict())
+
+    index = {}
+    for grade, week in shards:
+        entry = index.setdefault(grade, {'dir': shard_dir_name(grade), 'weeks': []})
+        entry['weeks'].append(week)
+    for entry in index.values():
+        entry['weeks'].sort()
+
+    written = {}
+    for (grade, week), courses in shards.items():
+        path = os.path.join(shard_dir, shard_dir_name(grade), f'{week}.json')
+        written[path] = write_if_changed(path, json_bytes(courses, compact))
+    expected = {os.path.normpath(path) for path in written}
+    index_path = os.path.join(shard_dir, 'index.json')
+    written[index_path] = write_if_changed(index_path, json_bytes({'grades': index}, compact))
+
+    # データのなくなった週のファイルを削除する
+    for grade_dir in os.listdir(shard_dir):
+        grade_path = os.path.join(shard_dir, grade_dir)
+        if not os.path.isdir(grade_path):
             continue
-        # 卒業研究は除外
-        #if course['courses'].startswith('卒業研究'):
-        #    continue
-        new_course = course.copy()
-        new_course['grade'] = '4年助産'
-        timetable.append(new_course)
+        for name in os.listdir(grade_path):
+            match = SHARD_NAME_RE.match(name)
+            # 圧縮ファイル（.gz, .br）は元のファイルがなくなったら削除する
+            if match and os.path.normpath(os.path.join(grade_path, match.group(1))) not in expected:
+                os.remove(os.path.join(grade_path, name))
+    updated = sum(written.values()) - written[index_path]
+    print(f'{shard_dir} に分割ファイルを保存しました（{len(shards)}件中{updated}件を更新）。')
+    return written
+
+def apply_inheritance(timetable, rules=INHERITANCE_RULES):
+    """
+    INHERITANCE_RULESに従って、元の学年の時間割を引き継ぐ先の学年に追加する関数
+
+    時間割データを1回だけ走査し、元の学年のデータを（日付, 時限）ごとに、引き継ぐ先の学年にある（日付, 時限）を
+    学年ごとにまとめてから、規則の順に追加する。引き継ぐ先の学年に同じ（日付, 時限）のデータがあれば追加しない。
+    同じ学年に引き継ぐ規則が複数あるときは、先の規則で追加したデータも「すでにあるデータ」として扱う。
+    同じ（日付, 時限）のデータが元の学年に複数あれば、最後のものを最初のものの位置で引き継ぐ。
+    引き継いで追加したデータを、さらに別の規則で引き継ぐことはない。
+
+    Args:
+        timetable (list): 時間割データのリスト（引き継いだデータを末尾に追加する）
+        rules (tuple): InheritanceRuleの一覧
+
+    Returns:
+        list: 引き継いだデータを追加した時間割データのリスト
+    """
+    sources = {rule.source: {} for rule in rules}
+    targets = {rule.target: set() for rule in rules}
+    for course in timetable:
+        grade = course.grade
+        if grade in sources:
+            sources[grade][course.date, course.period] = course
+        if grade in targets:
+            targets[grade].add((course.date, course.period))
+    for rule in rules:
+        exclude = [re.compile(pattern) for pattern in rule.exclude]
+        existing = targets[rule.target]
+        for key, course in sources[rule.source].items():
+            if key in existing:
+                continue
+            if any(pattern.match(str(course.courses)) for pattern in exclude):
+                continue
+            # 学年以外の値はそのまま共有する
+            timetable.append(Course(rule.target, *course[1:]))
+            existing.add(key)
     return timetable
 
-def make_info_json(file_path, info_json_path):
-    file_stat = os.stat(file_path)
-    # 日本時間（UTC+9）のタイムゾーンを定義
-    jst = timezone(timedelta(hours=9))
-    # UTCタイムスタンプを日本時間に変換
-    modified_time = datetime.fromtimestamp(file_stat.st_mtime, tz=jst).strftime('%Y-%m-%d %H:%M:%S')
+def overlay_by_date(records):
+    """
+    日付順の時間割データを1日分ずつまとめ、その日の分だけでapply_inheritanceを行うジェネレータ
+
+    学年の引き継ぎは同じ日付のデータの間でしか起きないため、1日分ずつ処理しても全体で処理した結果と同じになる。
+    各日のデータはsort_timetableと同じ順に並べて返す。
+
+    Args:
+        records (iterable): 日付順に並んだ時間割データ（stream_timetableの結果など）
 
+    Yields:
+        Course: 時間割データ
+    """
+    for _, courses in groupby(records, key=attrgetter('date')):
+        yield from sort_timetable(apply_inheritance(list(courses)))
+
+def source_info(file_path, reproducible=False):
+    """
+    エクセルファイルのパスと更新時刻（日本時間）を返す関数
+
+    reproducibleがTrueなら、ファイルシステムの更新時刻（チェックアウトした時刻になる）ではなく、
+    ファイルの中に記録された最終保存日時（docProps/core.xml）を使う。記録がなければNoneにする。
+    """
+    if reproducible:
+        with zipfile.ZipFile(file_path) as archive:
+            modified = xlsx_reader.read_modified_time(archive)
+        modified_time = modified.astimezone(JST).strftime('%Y-%m-%d %H:%M:%S') if modified else None
+    else:
+        file_stat = os.stat(file_path)
+        # UTCタイムスタンプを日本時間に変換
+        modified_time = datetime.fromtimestamp(file_stat.st_mtime, tz=JST).strftime('%Y-%m-%d %H:%M:%S')
+    return {"file_path": file_path, "last_modified": modified_time}
+
+def make_info_json(file_path, info_json_path, reproducible=False):
     # 更新時刻をinfo.jsonに書き込む
-    info_data = {"file_path": file_path, "last_modified": modified_time}
-    with open(info_json_path, 'w', encoding='utf-8') as f:
-        json.dump(info_data, f, ensure_ascii=False, indent=2)
+    info_data = source_info(file_path, reproducible)
+    written = write_if_changed(info_json_path, json_bytes(info_data))
     print(f'{info_json_path} に更新時刻を保存しました。')
+    return written
+
+def schedule_key(course):
+    """
+    差分を取るときのキー（学年, 日付, 時限）を返す関数
+    """
+    return course.grade, course.date, course.period
+
+def schedule_version(timetable):
+    """
+    時間割データの版を表す文字列を返す関数
+
+    データの並び順によらず、内容が同じなら同じ版になる。
+    """
+    canonical = sorted(json.dumps(list(course), ensure_ascii=False) for course in timetable)
+    return hashlib.sha256('\n'.join(canonical).encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+def _group_by_key(timetable):
+    groups = defaultdict(list)
+    for course in timetable:
+        groups[schedule_key(course)].append(course)
+    return groups
+
+def diff_schedules(old, new):
+    """
+    2つの版の時間割データの差分を作る関数
+
+    Args:
+        old (list): 前の版の時間割データのリスト
+        new (list): 新しい版の時間割データのリスト
+
+    Returns:
+        dict: from・to（版）、added（追加されたデータ）、removed（削除されたキー）、
+              changed（内容が変わったキーの新しいデータ）
+    """
+    old_groups = _group_by_key(old)
+    new_groups = _group_by_key(new)
+    added = []
+    changed = []
+    for key, courses in new_groups.items():
+        if key not in old_groups:
+            added.extend(courses)
+        elif old_groups[key] != courses:
+            changed.extend(courses)
+    removed = [list(key) for key in old_groups if key not in new_groups]
+    return {
+        'from': schedule_version(old),
+        'to': schedule_version(new),
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+    }
+
+def apply_patch(timetable, patch):
+    """
+    diff_schedulesで作った差分を時間割データに当てる関数
+
+    removedとchangedのキーのデータを取り除き、addedとchangedのデータを加える。
+
+    Returns:
+        list: 新しい版の時間割データのリスト
+    """
+    replaced = {tuple(key) for key in patch['removed']}
+    replaced.update(schedule_key(course) for course in patch['changed'])
+    return [course for course in timetable if schedule_key(course) not in replaced] + patch['added'] + patch['changed']
+
+def save_delta(previous, timetable, delta_dir, keep=10):
+    """
+    前回の版からの差分ファイルを保存し、直近keep件の差分の一覧をindex.jsonに保存する関数
+
+    delta_dir/{前の版}_{新しい版}.json に差分を保存する。前の版のデータを持っているクライアントは、
+    index.jsonの差分を順に当てれば、全体を取り直さずに最新の版にできる。
+
+    Args:
+        previous (list): 前回の時間割データのリスト（前回のデータがなければNone）
+        timetable (list): 今回の時間割データのリスト
+        delta_dir (str): 差分ファイルを保存するディレクトリ
+        keep (int): 残しておく差分の件数
+
+    Returns:
+        dict: 保存したファイルのパスをキー、書き込んだかどうかを値とする辞書
+    """
+    index_path = os.path.join(delta_dir, 'index.json')
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {'latest': None, 'patches': []}
+
+    written = {}
+    version = schedule_version(timetable)
+    if previous is not None and schedule_version(previous) != version:
+        patch = diff_schedules(previous, timetable)
+        # 差分を当てると今回の版になることを確かめてから保存する
+        if schedule_version(apply_patch(previous, patch)) != version:
+            raise ValueError('差分を当てた結果が新しい時間割データと一致しません。')
+        name = f"{patch['from']}_{patch['to']}.json"
+        # 追加・変更されたデータは辞書にして保存する
+        patch_data = {**patch, 'added': [course._asdict() for course in patch['added']],
+                      'changed': [course._asdict() for course in patch['changed']]}
+        written[os.path.join(delta_dir, name)] = write_if_changed(os.path.join(delta_dir, name), json_bytes(patch_data, compact=True))
+        patches = [entry for entry in index['patches'] if entry['file'] != name]
+        patches.append({'from': patch['from'], 'to': patch['to'], 'file': name,
+                        'added': len(patch['added']), 'removed': len(patch['removed']), 'changed': len(patch['changed'])})
+        index['patches'] = patches[-keep:]
+        print(f"{delta_dir} に差分を保存しました（追加{len(patch['added'])}件、削除{len(patch['removed'])}件、変更{len(patch['changed'])}件）。")
+    index['latest'] = version
+
+    # 一覧から外れた差分ファイルを削除する
+    kept = {entry['file'] for entry in index['patches']}
+    if os.path.isdir(delta_dir):
+        for name in os.listdir(delta_dir):
+            match = DELTA_NAME_RE.match(name)
+            if match and match.group(1) not in kept:
+                os.remove(os.path.join(delta_dir, name))
+    written[index_path] = write_if_changed(index_path, json_bytes(index))
+    return written
+
+def hashed_name(path, data):
+    """
+    "schedule.json"を"schedule.0123456789ab.json"のように、内容のハッシュ入りの名前にする関数
+    """
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+
+def save_manifest(paths, manifest_path, sources, retention_days=7, reproducible=False):
+    """
+    データファイルを内容のハッシュ入りの名前でも保存し、元の名前との対応をmanifest.jsonに保存する関数
+
+    ハッシュ入りのファイルは内容が変わると名前も変わるため、ブラウザやCDNでずっとキャッシュできる。
+    クライアントは小さなmanifest.jsonだけを毎回取り直せばよい。
+    使われなくなったハッシュ入りのファイルは、使われなくなったビルドの実際の時刻からretention_days日たったら削除する。
+    期限にかかわらず、使われなくなったビルドでは削除せず、少なくとも次のビルドまでは残す。
+
+    Args:
+        paths (list): データファイルのパスのリスト（manifest_pathと同じディレクトリにあるもの）
+        manifest_path (str): manifest.jsonのパス
+        sources (list): 元のエクセルファイルのパスのリスト
+        retention_days (float): 使われなくなったハッシュ入りのファイルを残しておく日数
+        reproducible (bool): Trueなら、作成時刻などに元のエクセルファイルの最終保存日時を使う
+
+    Returns:
+        dict: 保存したファイルのパスをキー、書き込んだかどうかを値とする辞書
+    """
+    manifest_dir = os.path.dirname(manifest_path) or '.'
+    now = datetime.now(JST)
+    source_infos = [{**source_info(path, reproducible), 'sha256': file_sha256(path)} for path in sources]
+    if reproducible:
+        # 同じ内容からは同じmanifest.jsonになるよう、最も新しいエクセルファイルの保存日時を作成時刻とする
+        built_at = max((info['last_modified'] for info in source_infos if info['last_modified']), default=None)
+    else:
+        built_at = now.strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    written = {}
+    files = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        target = hashed_name(path, data)
+        written[target] = write_if_changed(target, data)
+        files[os.path.relpath(path, manifest_dir)] = os.path.relpath(target, manifest_dir)
+
+    # 使われなくなったハッシュ入りのファイルは、使われなくなった時刻を記録しておき、期限が過ぎたら削除する。
+    # 古いmanifest.jsonをキャッシュしているクライアントのため、期限はbuilt_at（再現可能なビルドではエクセルの
+    # 保存日時）ではなく、実際に使われなくなったビルドの時刻から数える
+    previous_retired = previous.get('retired', {})
+    retired = dict(previous_retired)
+    current = set(files.values())
+    for name in sorted(os.listdir(manifest_dir)):
+        match = HASHED_NAME_RE.match(name)
+        if match and match.group(1) not in current:
+            retired.setdefault(match.group(1), now.strftime('%Y-%m-%d %H:%M:%S'))
+    for name in list(retired):
+        if name in current or not os.path.exists(os.path.join(manifest_dir, name)):
+            del retired[name]
+            continue
+        if name not in previous_retired:
+            continue
+        retired_at = datetime.strptime(retired[name], '%Y-%m-%d %H:%M:%S').replace(tzinfo=JST)
+        if now - retired_at > timedelta(days=retention_days):
+            for suffix in ('', '.gz', '.br'):
+                if os.path.exists(os.path.join(manifest_dir, name + suffix)):
+                    os.remove(os.path.join(manifest_dir, name + suffix))
+            del retired[name]
+
+    manifest = {
+        'built_at': built_at,
+        'files': files,
+        'sources': source_infos,
+        'retired': retired,
+    }
+    written[manifest_path] = write_if_changed(manifest_path, json_bytes(manifest))
+    print(f'{manifest_path} にファイル名の対応を保存しました。')
+    return written
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='エクセルの時間割をJSONに変換する')
+    parser.add_argument('--workers', type=int, default=1, help='シートを並列に変換するプロセス数')
+    parser.add_argument('--cache-dir', default='.cache/excel2json', help='解析結果のキャッシュを保存するディレクトリ')
+    parser.add_argument('--cache-size', type=int, default=8, help='残しておくキャッシュの世代数')
+    parser.add_argument('--no-cache', action='store_true', help='キャッシュを使わずに毎回読み込む')
+    parser.add_argument('--reader', choices=READERS, default='xml', help='ワークブックの読み込み方法')
+    parser.add_argument('--metrics', help='段階ごとの処理時間を保存するJSONファイル（既定: docs/build_metrics.json、--reproducibleのときはキャッシュのディレクトリ）')
+    parser.add_argument('--compact', action='store_true', help='schedule.jsonを空白・改行なしで保存する')
+    parser.add_argument('--layout', choices=LAYOUTS, default='records', help='schedule.jsonの形式')
+    parser.add_argument('--shard-dir', help='学年・週ごとの分割ファイルを保存するディレクトリ（例: docs/data）')
+    parser.add_argument('--precompress', action='store_true', help='出力したファイルを圧縮した .gz と .br も保存する（.brはbrotliが必要）')
+    parser.add_argument('--hashed', action='store_true', help='データファイルを内容のハッシュ入りの名前でも保存し、manifest.jsonを作る')
+    parser.add_argument('--retention-days', type=float, default=7, help='使われなくなったハッシュ入りのファイルを残しておく日数')
+    parser.add_argument('--delta-dir', help='前回の出力からの差分ファイルを保存するディレクトリ（例: docs/delta）')
+    parser.add_argument('--delta-keep', type=int, default=10, help='残しておく差分ファイルの件数')
+    parser.add_argument('--reproducible', action='store_true',
+                        help='同じエクセルの内容からは常に同じバイト列を出力する（データの並び順を固定し、時刻はファイルの中の保存日時を使う）')
+    parser.add_argument('--room-dir', help='教室ごとの使用状況（rooms.json）と重複の一覧（conflicts.json）を保存するディレクトリ（例: docs/rooms）。--streamでも教室の使用状況は全期間分をメモリに持つ')
+    parser.add_argument('--sqlite', help='時間割データを保存するSQLiteのデータベース（例: schedule.db）')
+    parser.add_argument('--parquet-dir', help='学期ごとに分けたParquetファイルを保存するディレクトリ（pyarrowが必要）')
+    parser.add_argument('--stream', action='store_true',
+                        help='全件をメモリにまとめずに1日分ずつ処理してschedule.jsonに書き出す（日付順で出力。--layout records のみ、キャッシュは使わない）')
+    parser.add_argument('--vectorized', action='store_true', help='シート単位の配列演算で変換する（pandasを使用）')
+    args = parser.parse_args()
+    if args.metrics is None:
+        # 処理時間は毎回変わるため、再現可能なビルドではdocs/の外に保存する
+        args.metrics = os.path.join(args.cache_dir, 'build_metrics.json') if args.reproducible else 'docs/build_metrics.json'
+    if args.stream and (args.layout != 'records' or args.shard_dir or args.delta_dir):
+        parser.error('--stream は --layout records のときだけ使え、--shard-dir・--delta-dir とは一緒に使えません。')
+
     s_excel_path = 'schedule_spring.xlsx'
     f_excel_path = 'schedule_fall.xlsx'
     json_path = 'docs/schedule.json'
+    index_path = 'docs/schedule_index.json'
     s_info_json_path = 'docs/info_spring.json'
     f_info_json_path = 'docs/info_fall.json'
+    manifest_path = 'docs/manifest.json'
 
-    sheet_names = {
-        '2025年度(1年前期)': '1年生',
-        '2025年度(2年前期)': '2年生',
-        '2025年度(3年前期)': '3年生',
-        '2025年度(4年前期)': '4年生',
-        '2025年度(助産前期)': '4年助産',
-        '2025年度(M1前期)': 'M1',
-        '2025年度(M2前期)': 'M2',
-        '2025年度(D1前期)': 'D1',
-        '2025年度(D23前期)': 'D2/D3',
-    }
+    jobs = semester_jobs(s_excel_path, f_excel_path)
+
+    metrics = BuildMetrics()
+    # 出力したファイルのパスと、今回書き込んだかどうか
+    outputs = {}
+    if args.stream:
+        # シートを1行ずつ読み、1日分ずつ助産への追加をしながら書き出す
+        # 日付・学年・時限の索引も1日分ずつ書き出す。教室の使用状況は教室ごとにまとめるため、全期間分をメモリに持つ
+        with metrics.phase('stream_to_json', file=json_path) as entry, LookupIndexWriter(index_path, args.compact) as index_writer:
+            rooms = new_room_index() if args.room_dir else None
+            records = iter_indexed(overlay_by_date(stream_timetable(jobs, args.reader)), index_writer, rooms)
+            outputs[json_path], entry['records'] = stream_to_json(records, json_path, args.compact)
+            entry['bytes'] = os.path.getsize(json_path)
+        outputs[index_path] = index_writer.written
+    else:
+        if args.no_cache:
+            schedules = convert_sheets(jobs, args.workers, args.vectorized, args.reader, metrics)
+        else:
+            schedules = convert_sheets_cached(jobs, args.cache_dir, args.cache_size, args.workers, args.vectorized, args.reader, metrics)
+
+        all_timetable = []
+        # 科目名・教室名の件数（dictionary形式の文字列表の並び順に使う）
+        value_counts = Counter()
+        for timetable, courses, rooms in schedules:
+            all_timetable.extend(timetable)
+            value_counts.update(courses)
+            value_counts.update(rooms)
+
+        with metrics.phase('apply_inheritance') as entry:
+            all_timetable = apply_inheritance(all_timetable)
+            entry['records'] = len(all_timetable)
+        if args.reproducible:
+            all_timetable = sort_timetable(all_timetable)
+        if args.delta_dir:
+            # 上書きする前に、前回の出力を読み込んでおく
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    previous_timetable = decode_schedule(json.load(f))
+            except (OSError, ValueError):
+                previous_timetable = None
+        with metrics.phase('save_to_json', file=json_path) as entry:
+            # 日付・学年・時限の索引も、schedule.jsonに書き出すのと同じ走査で作る
+            index = new_lookup_index()
+            outputs[json_path] = save_to_json(all_timetable, json_path, args.compact, args.layout, value_counts, index)
+            entry['records'] = len(all_timetable)
+            entry['bytes'] = os.path.getsize(json_path)
+
+        if args.shard_dir:
+            with metrics.phase('save_shards', dir=args.shard_dir) as entry:
+                written = save_shards(all_timetable, args.shard_dir, args.compact)
+                entry['records'] = len(all_timetable)
+                entry['files_written'] = sum(written.values())
+            outputs.update(written)
+
+        if args.delta_dir:
+            with metrics.phase('save_delta', dir=args.delta_dir) as entry:
+                written = save_delta(previous_timetable, all_timetable, args.delta_dir, args.delta_keep)
+                entry['files_written'] = sum(written.values())
+            outputs.update(written)
+
+    if not args.stream:
+        # ストリーミングのときは、schedule.jsonを書き出しながら索引も書き出してある
+        with metrics.phase('save_lookup_index', file=index_path) as entry:
+            outputs[index_path] = write_if_changed(index_path, json_bytes(index, args.compact))
+            entry['bytes'] = os.path.getsize(index_path)
+    print(f'{index_path} に日付・学年・時限の索引を保存しました。')
+
+    if args.room_dir:
+        with metrics.phase('save_room_index', dir=args.room_dir) as entry:
+            # ストリーミングのときは、schedule.jsonを書き出しながら作ってある
+            if not args.stream:
+                rooms = build_room_index(all_timetable)
+            written = save_room_index(rooms, args.room_dir)
+            entry['rooms'] = len(rooms['slots'])
+            entry['conflicts'] = len(rooms['conflicts'])
+            entry['files_written'] = sum(written.values())
+        outputs.update(written)
+
+    if args.sqlite:
+        with metrics.phase('save_to_sqlite', file=args.sqlite) as entry:
+            # ストリーミングのときは、エクセルをもう一度読みながら保存する
+            records = overlay_by_date(stream_timetable(jobs, args.reader)) if args.stream else all_timetable
+            entry['written'], entry['records'] = save_to_sqlite(records, args.sqlite)
+            entry['bytes'] = os.path.getsize(args.sqlite)
 
-    all_timetable = []
+    if args.parquet_dir:
+        with metrics.phase('save_to_parquet', dir=args.parquet_dir) as entry:
+            records = overlay_by_date(stream_timetable(jobs, args.reader)) if args.stream else all_timetable
+            written = save_to_parquet(records, args.parquet_dir)
+            entry['files_written'] = sum(written.values())
 
-    for sheet_name, grade_name in sheet_names.items():
-        timetable, _, _ = get_schedule(s_excel_path, sheet_name, grade_name)
-        all_timetable.extend(timetable)
+    for excel_path, info_json_path in ((s_excel_path, s_info_json_path), (f_excel_path, f_info_json_path)):
+        with metrics.phase('make_info_json', file=info_json_path) as entry:
+            outputs[info_json_path] = make_info_json(excel_path, info_json_path, args.reproducible)
+            entry['bytes'] = os.path.getsize(info_json_path)
 
-    for sheet_name, grade_name in sheet_names.items():
-        sheet_name = sheet_name.replace('前期', '後期')
-        timetable, _, _ = get_schedule(f_excel_path, sheet_name, grade_name)
-        all_timetable.extend(timetable)
+    if args.hashed:
+        with metrics.phase('save_manifest', file=manifest_path) as entry:
+            written = save_manifest([json_path, index_path, s_info_json_path, f_info_json_path], manifest_path,
+                                    [s_excel_path, f_excel_path], args.retention_days, args.reproducible)
+            entry['files_written'] = sum(written.values())
+        outputs.update(written)
 
-    all_timetable = add_schedule_to_josan(all_timetable)
-    save_to_json(all_timetable, json_path)
+    if args.precompress:
+        if brotli_bytes(b'') is None:
+            print('brotliがインストールされていないため、.br は作成しません。')
+        with metrics.phase('precompress') as entry:
+            compressed = [path for path, written in outputs.items() for path in save_precompressed(path, written)]
+            entry['files_written'] = len(compressed)
+        print(f'圧縮ファイルを{len(compressed)}件保存しました。')
 
-    make_info_json(s_excel_path, s_info_json_path)
-    make_info_json(f_excel_path, f_info_json_path)
+    if args.metrics:
+        metrics.save(args.metrics)
@@ -0,0 +1,178 @@
+"""
+excel2jsonの出力（schedule.json）を、NumPyの構造化配列として持って検索するためのモジュール
+
+時間割データは次の列を持つ構造化配列にし、（学年, 日付, 時限）の順に並べておく。
+
+* date: 日付（datetime64[D]）
+* grade: 学年の番号（uint8、gradesの添字）
+* period: 時限（uint8、0は備考）
+* course, room, comment: 科目名・教室・備考の番号（uint32、stringsの添字）
+
+学年ごとのデータは連続して日付順に並ぶため、学年と期間での検索はsearchsortedで、
+科目や教室での検索は配列全体のマスクで、どちらもPythonのループなしで行う。
+
+使い方:
+    store = TimetableStore.from_json('docs/schedule.json')
+    store.to_records(store.week('1年生', '2025-04-09'))
+"""
+from datetime import datetime
+import json
+
+import numpy as np
+
+import excel2json
+
+DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('grade', np.uint8),
+    ('period', np.uint8),
+    ('course', np.uint32),
+    ('room', np.uint32),
+    ('comment', np.uint32),
+])
+
+
+def to_day(value):
+    """
+    "2025-04-03"、date、datetimeのいずれかをdatetime64[D]に変換する関数
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+class TimetableStore:
+    """
+    時間割データを（学年, 日付, 時限）の順に並べた構造化配列として持ち、検索する
+
+    Attributes:
+        data (numpy.ndarray): DTYPEの構造化配列
+        grades (list): 学年名の一覧（gradeの番号の順）
+        strings (list): 科目名・教室・備考の文字列表（course, room, commentの番号の順）
+    """
+
+    def __init__(self, timetable, grades=tuple(excel2json.SHEET_NAMES.values())):
+        """
+        Args:
+            timetable (iterable): 時間割データ（Course）
+            grades (tuple): 学年の並び順（gradesにない学年はその後に出てきた順に並べる）
+        """
+        self.grades = list(grades)
+        grade_ids = {grade: i for i, grade in enumerate(self.grades)}
+        # 101と"101"を区別するため、値の型も含めて文字列表の番号を振る
+        string_ids = {(str, ''): 0}
+        self.strings = ['']
+        columns = {name: [] for name in DTYPE.names}
+        for course in timetable:
+            if course.grade not in grade_ids:
+                grade_ids[course.grade] = len(self.grades)
+                self.grades.append(course.grade)
+            columns['date'].append(course.date)
+            columns['grade'].append(grade_ids[course.grade])
+            columns['period'].append(course.period)
+            for name, value in (('course', course.courses), ('room', course.room), ('comment', course.comment)):
+                key = (type(value), value)
+                if key not in string_ids:
+                    string_ids[key] = len(self.strings)
+                    self.strings.append(value)
+                columns[name].append(string_ids[key])
+        if len(self.grades) > np.iinfo(np.uint8).max + 1:
+            raise ValueError(f'学年が多すぎます（{len(self.grades)}件）。')
+
+        data = np.empty(len(columns['date']), dtype=DTYPE)
+        for name in DTYPE.names:
+            data[name] = columns[name]
+        order = np.lexsort((data['period'], data['date'], data['grade']))
+        self.data = data[order]
+
+        # 学年と日付をまとめた整数のキー（学年の番号を上位32ビット、1970-01-01からの日数を下位32ビットに置く）。
+        # dataと同じ順に並ぶため、学年と期間での検索は1回のsearchsortedで済む
+        self._keys = (self.data['grade'].astype(np.int64) << 32) | self.data['date'].astype(np.int64)
+        self._string_array = np.array(self.strings, dtype=object)
+        # 数値の教室（101）と文字列の教室（"101"）のどちらでも検索できるよう、文字列にした値から番号を引く
+        self._ids_by_text = {}
+        for i, value in enumerate(self.strings):
+            self._ids_by_text.setdefault(str(value), []).append(i)
+
+    @classmethod
+    def from_json(cls, json_path='docs/schedule.json'):
+        """
+        excel2jsonで保存したschedule.json（どの形式でもよい）から作る
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return cls(excel2json.decode_schedule(json.load(f)))
+
+    def __len__(self):
+        return len(self.data)
+
+    def _key(self, grades, day):
+        return (np.asarray(grades, dtype=np.int64) << 32) | to_day(day).astype(np.int64)
+
+    def _string_ids(self, value):
+        return np.array(self._ids_by_text.get(str(value), []), dtype=np.uint32)
+
+    def date_range(self, grade, start, end):
+        """
+        1つの学年の、start以上end未満の日付のデータを返す（searchsortedで範囲を求める）
+
+        Returns:
+            numpy.ndarray: 該当するデータ（dataの一部分のビュー）
+        """
+        grade_id = self.grades.index(grade)
+        first, last = np.searchsorted(self._keys, [self._key(grade_id, start), self._key(grade_id, end)])
+        return self.data[first:last]
+
+    def week(self, grade, day, days=7):
+        """
+        1つの学年の、dayを含む週（月曜日から）のデータを返す
+
+        Args:
+            grade (str): 学年名
+            day: 週の中の日付
+            days (int): 月曜日から何日分を返すか（5なら月〜金）
+        """
+        day = to_day(day)
+        monday = day - np.timedelta64(day.item().weekday(), 'D')
+        return self.date_range(grade, monday, monday + np.timedelta64(days, 'D'))
+
+    def day(self, day):
+        """
+        全学年の、1日分のデータを返す（学年の順）
+        """
+        day = to_day(day)
+        grade_ids = np.arange(len(self.grades))
+        first = np.searchsorted(self._keys, self._key(grade_ids, day))
+        last = np.searchsorted(self._keys, self._key(grade_ids, day + np.timedelta64(1, 'D')))
+        # 学年ごとの範囲[first, last)をつなげた添字を作る
+        counts = last - first
+        starts = np.repeat(first - np.cumsum(counts) + counts, counts)
+        return self.data[starts + np.arange(counts.sum())]
+
+    def course_sessions(self, course):
+        """
+        1つの科目のすべての授業を返す
+        """
+        return self.data[np.isin(self.data['course'], self._string_ids(course))]
+
+    def room_usage(self, room, start=None, end=None):
+        """
+        1つの教室の、start以上end未満の日付の授業を返す（start, endを省略すると全期間）
+        """
+        mask = np.isin(self.data['room'], self._string_ids(room))
+        if start is not None:
+            mask &= self.data['date'] >= to_day(start)
+        if end is not None:
+            mask &= self.data['date'] < to_day(end)
+        return self.data[mask]
+
+    def to_records(self, rows):
+        """
+        検索結果の構造化配列を、時間割データ（Course）のリストに戻す
+        """
+        grades = np.array(self.grades, dtype=object)[rows['grade']]
+        dates = np.datetime_as_string(rows['date'], unit='D').tolist()
+        values = zip(
+            grades, dates, rows['period'].tolist(),
+            self._string_array[rows['course']], self._string_array[rows['room']], self._string_array[rows['comment']],
+        )
+        return [excel2json.make_course(*row) for row in values]
@@ -0,0 +1,319 @@
+"""
+時間割の読み込みに必要な部分だけを直接読む、最小限のxlsxリーダー
+
+xlsxはXMLファイルをまとめたzipファイルで、openpyxlはスタイルや図形などもすべて読み込む。
+このモジュールは次のパーツだけを逐次解析（iterparse）で読む。
+
+* xl/workbook.xml とその関連付け：シート名とパーツのパスの対応
+* xl/sharedStrings.xml：共有文字列
+* xl/styles.xml：セルの表示形式のうち、日付かどうかの判定に必要な部分だけ
+* xl/worksheets/sheetN.xml：必要なシートだけ（1行ずつ読み捨てる）
+
+openpyxlの読み取り専用モード（read_only=True, data_only=True）と同じ値を返す。
+"""
+from datetime import datetime, timedelta
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+# xlsxの中で使われるXMLの名前空間
+NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+NS_DCTERMS = '{http://purl.org/dc/terms/}'
+
+ROW_TAG = f'{NS_MAIN}row'
+CELL_TAG = f'{NS_MAIN}c'
+VALUE_TAG = f'{NS_MAIN}v'
+TEXT_TAG = f'{NS_MAIN}t'
+RUN_TAG = f'{NS_MAIN}r'
+INLINE_STRING_TAG = f'{NS_MAIN}is'
+
+WINDOWS_EPOCH = datetime(1899, 12, 30)
+MAC_EPOCH = datetime(1904, 1, 1)
+SECS_PER_DAY = 86400
+
+# 組み込みの表示形式のうち、日付・時刻のもの（openpyxlのBUILTIN_FORMATSと同じ）
+BUILTIN_DATE_FORMATS = {
+    14: 'mm-dd-yy', 15: 'd-mmm-yy', 16: 'd-mmm', 17: 'mmm-yy', 18: 'h:mm AM/PM',
+    19: 'h:mm:ss AM/PM', 20: 'h:mm', 21: 'h:mm:ss', 22: 'm/d/yy h:mm',
+    45: 'mm:ss', 46: '[h]:mm:ss', 47: 'mmss.0',
+}
+# 引用符で囲まれた文字列と、時・分・秒以外の[]は日付の判定から除く
+STRIP_RE = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+DATE_RE = re.compile(r'(?<![_\\])[dmhysDMHYS]')
+TIMEDELTA_RE = re.compile(r'\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?|\[ss?\](\.0*)?', re.I)
+
+
+def workbook_parts(archive):
+    """
+    xlsxのworkbook.xmlとその関連付けから、シート名と各パーツのパスの対応を読む関数
+
+    Args:
+        archive (zipfile.ZipFile): 開いたxlsxファイル
+
+    Returns:
+        dict: sheets（シート名→パーツのパス）, shared_strings, styles, date1904
+    """
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {}
+    shared_strings = styles = None
+    for rel in rels.iter(f'{NS_PKG_REL}Relationship'):
+        target = rel.get('Target')
+        # Targetはxl/からの相対パス、または/から始まる絶対パス
+        path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(f'xl/{target}')
+        targets[rel.get('Id')] = path
+        if rel.get('Type').endswith('/sharedStrings'):
+            shared_strings = path
+        elif rel.get('Type').endswith('/styles'):
+            styles = path
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    sheets = {sheet.get('name'): targets[sheet.get(f'{NS_REL}id')] for sheet in workbook.iter(f'{NS_MAIN}sheet')}
+    properties = workbook.find(f'{NS_MAIN}workbookPr')
+    date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+    return {'sheets': sheets, 'shared_strings': shared_strings, 'styles': styles, 'date1904': date1904}
+
+
+def read_modified_time(archive):
+    """
+    docProps/core.xmlから、エクセルでファイルが最後に保存された日時（UTC）を読む関数
+
+    Args:
+        archive (zipfile.ZipFile): 開いたxlsxファイル
+
+    Returns:
+        datetime: 最終保存日時（タイムゾーン付き）。記録されていなければNone
+    """
+    try:
+        core = ET.fromstring(archive.read('docProps/core.xml'))
+    except KeyError:
+        return None
+    modified = core.findtext(f'{NS_DCTERMS}modified')
+    if not modified:
+        return None
+    try:
+        return datetime.fromisoformat(modified.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def text_content(element):
+    """
+    <si>や<is>要素の文字列を返す関数。ふりがな（rPh）は含めない。
+    """
+    snippets = [element.findtext(TEXT_TAG) or '']
+    for run in element.iterfind(RUN_TAG):
+        snippets.append(run.findtext(TEXT_TAG) or '')
+    return ''.join(snippets)
+
+
+def read_shared_strings(source):
+    """
+    共有文字列の一覧を読む関数
+    """
+    strings = []
+    for _, element in ET.iterparse(source):
+        if element.tag == f'{NS_MAIN}si':
+            strings.append(text_content(element).replace('x005F_', ''))
+            element.clear()
+    return strings
+
+
+def is_date_format(fmt):
+    fmt = STRIP_RE.sub('', fmt.split(';')[0])
+    return DATE_RE.search(fmt) is not None
+
+
+def read_date_styles(source):
+    """
+    styles.xmlから、日付・時刻の表示形式を持つセルスタイルの番号を読む関数
+
+    フォントや塗りつぶしなどは読み飛ばし、cellXfsを読み終えたところで解析をやめる。
+
+    Returns:
+        tuple: (日付のスタイル番号の集合, 経過時間のスタイル番号の集合)
+    """
+    custom = {}
+    date_styles = set()
+    timedelta_styles = set()
+    in_cell_xfs = False
+    index = 0
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            if tag == f'{NS_MAIN}cellXfs':
+                in_cell_xfs = True
+            continue
+        if tag == f'{NS_MAIN}numFmt':
+            custom[int(element.get('numFmtId'))] = element.get('formatCode')
+        elif tag == f'{NS_MAIN}xf' and in_cell_xfs:
+            num_fmt_id = int(element.get('numFmtId', 0))
+            fmt = custom[num_fmt_id] if num_fmt_id in custom else BUILTIN_DATE_FORMATS.get(num_fmt_id)
+            if fmt is not None and is_date_format(fmt):
+                date_styles.add(index)
+            if fmt is not None and TIMEDELTA_RE.search(fmt.split(';')[0]):
+                timedelta_styles.add(index)
+            index += 1
+        elif tag == f'{NS_MAIN}cellXfs':
+            break
+        if not in_cell_xfs or tag == f'{NS_MAIN}xf':
+            element.clear()
+    return date_styles, timedelta_styles
+
+
+def from_excel(value, epoch=WINDOWS_EPOCH, as_timedelta=False):
+    """
+    エクセルのシリアル値を日時に変換する関数（openpyxl.utils.datetime.from_excelと同じ）
+    """
+    if as_timedelta:
+        td = timedelta(days=value)
+        if td.microseconds:
+            td = timedelta(seconds=td.total_seconds() // 1, microseconds=round(td.microseconds, -3))
+        return td
+    day, fraction = divmod(value, 1)
+    diff = timedelta(milliseconds=round(fraction * SECS_PER_DAY * 1000))
+    if 0 <= value < 1 and diff.days == 0:
+        return (datetime.min + diff).time()
+    # 1900年を閏年として扱うエクセルの仕様に合わせる
+    if 0 < value < 60 and epoch == WINDOWS_EPOCH:
+        day += 1
+    return epoch + timedelta(days=day) + diff
+
+
+def column_index(reference):
+    """
+    "AB12"のようなセル番地から列番号（1始まり）を返す関数
+    """
+    index = 0
+    for char in reference:
+        if char.isdigit():
+            break
+        index = index * 26 + ord(char) - 64
+    return index
+
+
+class XlsxSheet:
+    """
+    1シート分の行を読むためのオブジェクト（openpyxlのワークシートと同じ使い方ができる）
+    """
+
+    def __init__(self, workbook, path):
+        self.workbook = workbook
+        self.path = path
+
+    def iter_rows(self, values_only=True):
+        """
+        シートの行を1行目から順に、セルの値のタプルとして返すジェネレータ
+
+        XMLに存在しない空行も空のタプルとして返す。読み終えた行はすぐに破棄する。
+        """
+        workbook = self.workbook
+        shared_strings = workbook.shared_strings
+        date_styles, timedelta_styles = workbook.date_styles
+        epoch = workbook.epoch
+        expected = 1
+        row_number = 0
+        with workbook.archive.open(self.path) as source:
+            for _, element in ET.iterparse(source):
+                if element.tag != ROW_TAG:
+                    continue
+                r = element.get('r')
+                row_number = int(float(r)) if r else row_number + 1
+                cells = {}
+                column = 0
+                for cell in element.iterfind(CELL_TAG):
+                    reference = cell.get('r')
+                    column = column_index(reference) if reference else column + 1
+                    data_type = cell.get('t', 'n')
+                    if data_type == 'inlineStr':
+                        child = cell.find(INLINE_STRING_TAG)
+                        value = text_content(child) if child is not None else None
+                    else:
+                        value = cell.findtext(VALUE_TAG) or None
+                        if value is None:
+                            pass
+                        elif data_type == 'n':
+                            value = float(value) if '.' in value or 'E' in value or 'e' in value else int(value)
+                            style = int(cell.get('s', 0))
+                            if style in date_styles:
+                                try:
+                                    value = from_excel(value, epoch, style in timedelta_styles)
+                                except (OverflowError, ValueError):
+                                    value = '#VALUE!'
+                        elif data_type == 's':
+                            value = shared_strings[int(value)]
+                        elif data_type == 'b':
+                            value = bool(int(value))
+                        elif data_type == 'd':
+                            value = datetime.fromisoformat(value)
+                    cells[column] = value
+                element.clear()
+                while expected < row_number:
+                    yield ()
+                    expected += 1
+                width = max(cells, default=0)
+                yield tuple(cells.get(i) for i in range(1, width + 1))
+                expected = row_number + 1
+
+
+class XlsxWorkbook:
+    """
+    必要なパーツだけを読むワークブック（openpyxlの読み取り専用ワークブックと同じ使い方ができる）
+
+    共有文字列と日付スタイルは、最初にシートを読むときに一度だけ読み込む。
+    """
+
+    def __init__(self, file_path):
+        self.archive = zipfile.ZipFile(file_path)
+        self.parts = workbook_parts(self.archive)
+        self.epoch = MAC_EPOCH if self.parts['date1904'] else WINDOWS_EPOCH
+        self._shared_strings = None
+        self._date_styles = None
+
+    @property
+    def sheetnames(self):
+        return list(self.parts['sheets'])
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            path = self.parts['shared_strings']
+            if path is None or path not in self.archive.NameToInfo:
+                self._shared_strings = []
+            else:
+                with self.archive.open(path) as source:
+                    self._shared_strings = read_shared_strings(source)
+        return self._shared_strings
+
+    @property
+    def date_styles(self):
+        if self._date_styles is None:
+            path = self.parts['styles']
+            if path is None or path not in self.archive.NameToInfo:
+                self._date_styles = (set(), set())
+            else:
+                with self.archive.open(path) as source:
+                    self._date_styles = read_date_styles(source)
+        return self._date_styles
+
+    def __getitem__(self, sheet_name):
+        if sheet_name not in self.parts['sheets']:
+            raise KeyError(f'Worksheet {sheet_name} does not exist.')
+        return XlsxSheet(self, self.parts['sheets'][sheet_name])
+
+    def close(self):
+        self.archive.close()
+
+
+def load_workbook(file_path):
+    """
+    xlsxファイルを開く関数
+
+    Args:
+        file_path (str): エクセルファイルのパス
+
+    Returns:
+        XlsxWorkbook: 開いたワークブック（使い終わったらclose()する）
+    """
+    return XlsxWorkbook(file_path)